@@ -33,6 +33,24 @@ SECURE_SSL_REDIRECT = (os.environ.get('SSL_VALUE') == 'True')
 CSRF_COOKIE_SECURE = (os.environ.get('SSL_VALUE') == 'True')
 SESSION_COOKIE_SECURE = (os.environ.get('SSL_VALUE') == 'True')
 
+# Serve the list/detail pages with their async variants; set by the ASGI server config (gunicorn_asgi.py)
+ASYNC_VIEWS = (os.environ.get('ASYNC_VIEWS') == 'True')
+
+# Per-view timings, Server-Timing headers and /metrics; METRICS_TOKEN lets a scraper in without a staff login
+PERFORMANCE_METRICS = (os.environ.get('PERFORMANCE_METRICS') == 'True')
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# Hand imports and exports to `manage.py run_workers` (the Procfile's worker process) instead of running them in the request
+BACKGROUND_JOBS = (os.environ.get('BACKGROUND_JOBS') == 'True')
+JOBS_PER_USER_LIMIT = int(os.environ.get('JOBS_PER_USER_LIMIT', 1))
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 3))
+# Seconds before the first retry; it doubles with every further attempt
+JOB_RETRY_DELAY = int(os.environ.get('JOB_RETRY_DELAY', 30))
+# A running job that hasn't reported progress for this many seconds is presumed lost and retried
+JOB_TIMEOUT = int(os.environ.get('JOB_TIMEOUT', 600))
+# Finished exports are kept here; use a shared DEFAULT_FILE_STORAGE when the workers run on other hosts
+MEDIA_ROOT = os.environ.get('MEDIA_ROOT', os.path.join(BASE_DIR, 'media'))
+
 
 # Application definition
 
@@ -51,6 +69,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'base.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -92,6 +111,44 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+# The stats cache runs without Redis: STATS_CACHE_BACKEND picks locmem (default), file or db
+
+STATS_CACHE_BACKENDS = {
+    'locmem': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'studiolog-stats',
+    },
+    'file': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('STATS_CACHE_LOCATION', os.path.join(BASE_DIR, 'stats_cache')),
+    },
+    'db': {
+        'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+        'LOCATION': 'base_stats_cache',
+    },
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'stats': dict(
+        STATS_CACHE_BACKENDS[os.environ.get('STATS_CACHE_BACKEND', 'locmem')],
+        TIMEOUT=int(os.environ.get('STATS_CACHE_TIMEOUT', 60 * 60 * 24)),
+    ),
+    # Rendered list rows and stats panels; the keys carry updated_at, so entries never go stale and
+    # the least recently used are evicted once there are FRAGMENT_CACHE_ENTRIES of them
+    'fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'studiolog-fragments',
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': int(os.environ.get('FRAGMENT_CACHE_ENTRIES', 10000))},
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -139,3 +196,25 @@ STATIC_URL = '/static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 django_heroku.settings(locals())
+
+# Database connections
+# DB_CONN_MAX_AGE is how many seconds a connection outlives its request (0 closes it after every request, None
+# never does); django_heroku sets 600 for a DATABASE_URL. DB_HEALTH_CHECKS=True pings a reused connection before
+# a request relies on it. DB_SSL_REQUIRE=False allows a local database without SSL. DB_POOL=True (PostgreSQL
+# only) keeps an in-process pool of up to DB_POOL_MAX_SIZE connections that requests borrow and hand back
+# instead of opening and closing their own; a request finding them all in use waits up to DB_POOL_TIMEOUT seconds.
+
+if 'DB_CONN_MAX_AGE' in os.environ:
+    DATABASES['default']['CONN_MAX_AGE'] = None if os.environ['DB_CONN_MAX_AGE'] == 'None' else int(os.environ['DB_CONN_MAX_AGE'])
+DATABASES['default']['CONN_HEALTH_CHECKS'] = (os.environ.get('DB_HEALTH_CHECKS') == 'True')
+if os.environ.get('DB_SSL_REQUIRE') == 'False':
+    DATABASES['default'].get('OPTIONS', {}).pop('sslmode', None)
+if os.environ.get('DB_POOL') == 'True' and DATABASES['default']['ENGINE'].startswith('django.db.backends.postgresql'):
+    DATABASES['default'].update(
+        ENGINE='base.backends.postgresql_pool',
+        # Ending a request returns the connection to the pool, which is what keeps it open
+        CONN_MAX_AGE=0,
+        POOL_MIN_SIZE=int(os.environ.get('DB_POOL_MIN_SIZE', 1)),
+        POOL_MAX_SIZE=int(os.environ.get('DB_POOL_MAX_SIZE', 10)),
+        POOL_TIMEOUT=float(os.environ.get('DB_POOL_TIMEOUT', 30)),
+    )
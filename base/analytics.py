@@ -0,0 +1,112 @@
+import datetime
+
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+
+from .models import DailyTotal, Practice
+
+GRANULARITIES = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+BREAKDOWNS = ('instrument', 'piece')
+# How far back the series reaches when no start date is given
+DEFAULT_BUCKETS = {'day': 30, 'week': 26, 'month': 12}
+MAX_BUCKETS = 1000
+
+
+def bucket_start(day, granularity):
+    # Same boundaries the database truncation uses: Mondays for weeks, the 1st for months
+    if granularity == 'week':
+        return day - datetime.timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket(day, granularity):
+    if granularity == 'week':
+        return day + datetime.timedelta(weeks=1)
+    if granularity == 'month':
+        return (day.replace(day=28) + datetime.timedelta(days=4)).replace(day=1)
+    return day + datetime.timedelta(days=1)
+
+
+def bucket_range(start, end, granularity):
+    day = bucket_start(start, granularity)
+    while day <= end:
+        yield day
+        day = next_bucket(day, granularity)
+
+
+def default_start(end, granularity):
+    day = bucket_start(end, granularity)
+    for _ in range(DEFAULT_BUCKETS[granularity] - 1):
+        day = bucket_start(day - datetime.timedelta(days=1), granularity)
+    return day
+
+
+def _as_date(value):
+    # Trunc on a DateField comes back as a date on some backends and a datetime on others
+    return value.date() if isinstance(value, datetime.datetime) else value
+
+
+def bucketed_rows(user, granularity, start, end, by=None):
+    # One grouped query; without a breakdown it reads the per-day rollup instead of every session
+    trunc = GRANULARITIES[granularity]
+    if by is None:
+        rows = DailyTotal.objects.filter(user=user, date__range=(start, end)).annotate(bucket=trunc('date')).values('bucket')
+        return rows.annotate(total=Sum('total_duration'), count=Sum('session_count')).order_by('bucket')
+    rows = Practice.objects.filter(user=user, date__range=(start, end)).annotate(bucket=trunc('date')).values('bucket', by, f'{by}__name')
+    return rows.annotate(total=Sum('duration'), count=Count('id')).order_by('bucket')
+
+
+def time_series(user, granularity='day', start=None, end=None, by=None):
+    """Practice totals per day, week or month between start and end (inclusive), with empty buckets filled in.
+
+    Totals are returned in seconds, one series for the user's whole practice or one per instrument/piece when
+    `by` is given. Buckets are labelled with their first day.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity '{granularity}'")
+    if by is not None and by not in BREAKDOWNS:
+        raise ValueError(f"Cannot break down by '{by}'")
+    end = end or datetime.date.today()
+    buckets = []
+    try:
+        start = bucket_start(start or default_start(end, granularity), granularity)
+        if start > end:
+            raise ValueError("start is after end")
+        for day in bucket_range(start, end, granularity):
+            buckets.append(day)
+            if len(buckets) > MAX_BUCKETS:
+                raise ValueError(f"More than {MAX_BUCKETS} buckets requested; use a coarser granularity or a shorter range")
+    except OverflowError:
+        # A range reaching past year 1 or 9999, where the buckets' boundaries can't be represented
+        raise ValueError("Dates are too close to 0001-01-01 or 9999-12-31")
+    positions = {day: index for index, day in enumerate(buckets)}
+
+    series = {}
+    for row in bucketed_rows(user, granularity, start, end, by):
+        key = row[by] if by else None
+        if key not in series:
+            series[key] = {
+                'id': key,
+                'name': row[f'{by}__name'] if by else None,
+                'totals': [0] * len(buckets),
+                'counts': [0] * len(buckets),
+            }
+        index = positions[_as_date(row['bucket'])]
+        series[key]['totals'][index] += int(row['total'].total_seconds())
+        series[key]['counts'][index] += row['count']
+
+    return {
+        'granularity': granularity,
+        'by': by,
+        'start': start,
+        'end': end,
+        'buckets': buckets,
+        # Biggest series first; unassigned sessions (no instrument/piece) sort last
+        'series': sorted(series.values(), key=lambda entry: (entry['id'] is None, -sum(entry['totals']), entry['name'] or '')),
+    }
@@ -0,0 +1,205 @@
+import datetime
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.dateparse import parse_date
+from django.views.generic.base import View
+
+from . import analytics, search, stats_cache
+from .filters import InstrumentFilter, PieceFilter, PracticeFilter
+from .jobs import job_to_dict
+from .models import Instrument, Job, Piece, Practice
+from .stats import with_practice_stats
+
+
+def seconds(duration):
+    if duration is None:
+        return None
+    return int(duration.total_seconds())
+
+
+def instrument_to_dict(instrument):
+    data = {'id': instrument.id, 'name': instrument.name, 'notes': instrument.notes}
+    if hasattr(instrument, 'total_duration'):
+        data['total_duration'] = seconds(instrument.total_duration)
+        data['session_count'] = instrument.session_count
+    return data
+
+
+def piece_to_dict(piece):
+    data = {'id': piece.id, 'name': piece.name, 'artist': piece.artist, 'album': piece.album, 'notes': piece.notes}
+    if hasattr(piece, 'total_duration'):
+        data['total_duration'] = seconds(piece.total_duration)
+        data['session_count'] = piece.session_count
+    return data
+
+
+def practice_to_dict(session):
+    return {
+        'id': session.id,
+        'date': session.date,
+        'duration': seconds(session.duration),
+        'instrument': {'id': session.instrument.id, 'name': session.instrument.name} if session.instrument else None,
+        'piece': {'id': session.piece.id, 'name': session.piece.name} if session.piece else None,
+        'notes': session.notes,
+    }
+
+
+def stream_json_array(rows, serialize):
+    # Yields one encoded row at a time, so the response never holds the whole result set
+    encoder = DjangoJSONEncoder()
+    yield '['
+    first = True
+    for row in rows:
+        yield ('' if first else ',') + encoder.encode(serialize(row))
+        first = False
+    yield ']'
+
+
+class ApiMixin:
+    model = None
+    serialize = None
+
+    def dispatch(self, request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'detail': 'Authentication required'}, status=401)
+        return super().dispatch(request, *args, **kwargs)
+
+    def get_base_queryset(self):
+        return self.model.objects.filter(user=self.request.user)
+
+
+class ApiListView(ApiMixin, View):
+    filterset_class = None
+    ordering = ['id']
+    chunk_size = 2000
+
+    def get_queryset(self):
+        return self.get_base_queryset().order_by(*self.ordering)
+
+    def get(self, request, *args, **kwargs):
+        filterset = self.filterset_class(request.GET, queryset=self.get_queryset(), request=request)
+        if not filterset.is_valid():
+            return JsonResponse({'errors': filterset.errors}, status=400)
+        rows = filterset.qs.iterator(chunk_size=self.chunk_size)
+        return StreamingHttpResponse(stream_json_array(rows, self.serialize), content_type='application/json')
+
+
+class ApiDetailView(ApiMixin, View):
+
+    def get(self, request, pk, *args, **kwargs):
+        try:
+            obj = self.get_base_queryset().get(pk=pk)
+        except self.model.DoesNotExist:
+            return JsonResponse({'detail': f"No {self.model._meta.verbose_name} found"}, status=404)
+        return JsonResponse(self.serialize(obj), encoder=DjangoJSONEncoder)
+
+
+class PracticeApiList(ApiListView):
+    model = Practice
+    filterset_class = PracticeFilter
+    serialize = staticmethod(practice_to_dict)
+    ordering = ['-date', '-id']
+
+
+class PracticeApiDetail(ApiDetailView):
+    model = Practice
+    serialize = staticmethod(practice_to_dict)
+
+    def get_base_queryset(self):
+        return super().get_base_queryset().select_related('instrument', 'piece')
+
+
+class InstrumentApiList(ApiListView):
+    model = Instrument
+    filterset_class = InstrumentFilter
+    serialize = staticmethod(instrument_to_dict)
+    ordering = ['name', 'id']
+
+    def get_queryset(self):
+        return with_practice_stats(super().get_queryset())
+
+
+class InstrumentApiDetail(ApiDetailView):
+    model = Instrument
+    serialize = staticmethod(instrument_to_dict)
+
+    def get_base_queryset(self):
+        return with_practice_stats(super().get_base_queryset())
+
+
+class PieceApiList(ApiListView):
+    model = Piece
+    filterset_class = PieceFilter
+    serialize = staticmethod(piece_to_dict)
+    ordering = ['name', 'id']
+
+    def get_queryset(self):
+        return with_practice_stats(super().get_queryset())
+
+
+class PieceApiDetail(ApiDetailView):
+    model = Piece
+    serialize = staticmethod(piece_to_dict)
+
+    def get_base_queryset(self):
+        return with_practice_stats(super().get_base_queryset())
+
+
+class AutocompleteApi(ApiMixin, View):
+    """Typeahead for the instrument and piece pickers: {"results": [{"id", "name"}]} whose name has words starting with ?q=.
+
+    The match goes through the search index's prefix lookup, and each user's answers are kept in the stats
+    cache until their next write, so retyping a query or reopening a form doesn't reach the database.
+    """
+    limit = 20
+
+    def get(self, request, *args, **kwargs):
+        query = ' '.join(search.terms(request.GET.get('q', '')))
+        results = stats_cache.get_or_compute(request.user.pk, f'{self.model._meta.model_name} choices', lambda: self.lookup(query), query)
+        return JsonResponse({'results': results})
+
+    def lookup(self, query):
+        queryset = search.filter_queryset(self.get_base_queryset(), query, fields=('name',))
+        return [{'id': pk, 'name': name} for pk, name in queryset.order_by('name', 'id').values_list('pk', 'name')[:self.limit]]
+
+
+class InstrumentAutocomplete(AutocompleteApi):
+    model = Instrument
+
+
+class PieceAutocomplete(AutocompleteApi):
+    model = Piece
+
+
+class JobApiDetail(ApiDetailView):
+    # Polled by the job page for progress
+    model = Job
+    serialize = staticmethod(job_to_dict)
+
+    def get_base_queryset(self):
+        return super().get_base_queryset().defer('payload')
+
+
+class AnalyticsApi(ApiMixin, View):
+    # ?granularity=day|week|month&by=instrument|piece&start=YYYY-MM-DD&end=YYYY-MM-DD
+    def get(self, request, *args, **kwargs):
+        granularity = request.GET.get('granularity', 'day')
+        by = request.GET.get('by') or None
+        try:
+            start, end = (self.get_date(name) for name in ('start', 'end'))
+            end = end or datetime.date.today()
+            # Bad parameters raise inside the computation, before anything is cached
+            data = stats_cache.get_or_compute(request.user.pk, 'analytics', lambda: analytics.time_series(request.user, granularity, start, end, by), granularity, by, start, end)
+        except ValueError as error:
+            return JsonResponse({'detail': str(error)}, status=400)
+        return JsonResponse(data, encoder=DjangoJSONEncoder)
+
+    def get_date(self, name):
+        value = self.request.GET.get(name)
+        if not value:
+            return None
+        date = parse_date(value)
+        if date is None:
+            raise ValueError(f"'{value}' is not a date (use YYYY-MM-DD)")
+        return date
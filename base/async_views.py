@@ -0,0 +1,102 @@
+import asyncio
+import functools
+
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+
+from . import versions
+from .backends import close_unhealthy_connections
+from .views import InstrumentDetail, InstrumentList, PieceDetail, PieceList, PracticeDetail, PracticeList
+
+
+def run_query(func):
+    """Runs an ORM call on a pool thread, and so on that thread's own database connection.
+
+    Django 3.2's ORM is synchronous only; giving each part of a page its own thread (rather than the one
+    thread-sensitive thread every sync_to_async call shares) is what lets the parts' queries overlap.
+    """
+    def call():
+        # Pool threads never see request_started/finished, so they honour CONN_MAX_AGE and the health checks themselves
+        close_old_connections()
+        close_unhealthy_connections()
+        try:
+            return func()
+        finally:
+            close_old_connections()
+    return sync_to_async(call, thread_sensitive=False)()
+
+
+class AsyncViewMixin:
+    http_method_names = ['get', 'head', 'options']
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+
+        # Django 3.2 only treats a view as async if the callable itself is a coroutine function
+        @functools.wraps(view)
+        async def async_view(request, *args, **kwargs):
+            return await view(request, *args, **kwargs)
+        return async_view
+
+    async def dispatch(self, request, *args, **kwargs):
+        # request.user is loaded from the session on first access, which must not happen on the event loop
+        if not await sync_to_async(lambda: request.user.is_authenticated)():
+            return self.handle_no_permission()
+        if request.method.lower() not in self.http_method_names:
+            return self.http_method_not_allowed(request, *args, **kwargs)
+        conditional, validators = await sync_to_async(self.get_conditional_response)(request)
+        if conditional is not None:
+            return conditional
+        response = getattr(self, request.method.lower())(request, *args, **kwargs)
+        if asyncio.iscoroutine(response):
+            response = await response
+        return versions.add_validators(response, *validators) if validators else response
+
+    async def get_context_parts_concurrently(self):
+        return await asyncio.gather(*(run_query(part) for part in self.get_context_parts()))
+
+
+class AsyncListMixin(AsyncViewMixin):
+
+    async def get(self, request, *args, **kwargs):
+        # Validating the filter looks up the chosen instrument/piece, so it runs off the loop as well
+        self.object_list = await sync_to_async(self.get_queryset)()
+        self.context_parts = await self.get_context_parts_concurrently()
+        context = await sync_to_async(self.get_context_data)()
+        return self.render_to_response(context)
+
+
+class AsyncDetailMixin(AsyncViewMixin):
+
+    async def get(self, request, *args, **kwargs):
+        self.object = await sync_to_async(self.get_object)()
+        self.context_parts = await self.get_context_parts_concurrently()
+        context = await sync_to_async(self.get_context_data)(object=self.object)
+        return self.render_to_response(context)
+
+
+class AsyncPracticeList(AsyncListMixin, PracticeList):
+    pass
+
+
+class AsyncPracticeDetail(AsyncDetailMixin, PracticeDetail):
+
+    def get_context_parts(self):
+        return []
+
+
+class AsyncInstrumentList(AsyncListMixin, InstrumentList):
+    pass
+
+
+class AsyncInstrumentDetail(AsyncDetailMixin, InstrumentDetail):
+    pass
+
+
+class AsyncPieceList(AsyncListMixin, PieceList):
+    pass
+
+
+class AsyncPieceDetail(AsyncDetailMixin, PieceDetail):
+    pass
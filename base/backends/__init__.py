@@ -0,0 +1,12 @@
+from django.db import connections
+
+
+def close_unhealthy_connections():
+    """Closes persistent connections that no longer answer, so the request opens a fresh one instead of failing.
+
+    Stands in for Django 4.1's CONN_HEALTH_CHECKS, which Django 3.2 reads but ignores; enabled per database
+    by the same setting.
+    """
+    for connection in connections.all():
+        if connection.settings_dict.get('CONN_HEALTH_CHECKS') and connection.connection is not None and not connection.is_usable():
+            connection.close()
@@ -0,0 +1,102 @@
+import os
+import threading
+
+import psycopg2.extras
+from django.db.backends.postgresql import base, creation
+from psycopg2 import pool as psycopg2_pool
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def close_pools(alias):
+    with _pools_lock:
+        for key in [key for key in _pools if key[1] == alias]:
+            _pools.pop(key).closeall()
+
+
+class BlockingConnectionPool(psycopg2_pool.ThreadedConnectionPool):
+    """A ThreadedConnectionPool that waits up to `timeout` seconds for a connection to come back when all
+    `maxconn` are lent out, instead of raising PoolError straight away.
+
+    A process can have more threads wanting a connection than the pool holds (gunicorn --threads, the async
+    views' context parts), and those should queue rather than fail.
+    """
+
+    def __init__(self, minconn, maxconn, *args, timeout=None, **kwargs):
+        super().__init__(minconn, maxconn, *args, **kwargs)
+        self.timeout = timeout
+        self._free = threading.BoundedSemaphore(maxconn)
+
+    def getconn(self, key=None):
+        if not self._free.acquire(timeout=self.timeout):
+            raise psycopg2_pool.PoolError(f"no database connection became free within {self.timeout} seconds")
+        try:
+            return super().getconn(key)
+        except BaseException:
+            self._free.release()
+            raise
+
+    def putconn(self, conn=None, key=None, close=False):
+        super().putconn(conn, key, close)
+        self._free.release()
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # The pool's idle connections would keep the test database in use
+        close_pools(self.connection.alias)
+        super()._destroy_test_db(test_database_name, verbosity)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """PostgreSQL behind an in-process connection pool: closing a connection hands it back for the next request.
+
+    The pool is per process and shared by its threads, and holds POOL_MIN_SIZE to POOL_MAX_SIZE connections. A
+    thread finding them all in use waits up to POOL_TIMEOUT seconds for one.
+    """
+    creation_class = DatabaseCreation
+
+    def get_pool(self, conn_params):
+        # Keyed by process too, so a forked worker never shares its parent's sockets
+        key = (os.getpid(), self.alias, repr(sorted(conn_params.items())))
+        with _pools_lock:
+            if key not in _pools:
+                _pools[key] = BlockingConnectionPool(
+                    self.settings_dict.get('POOL_MIN_SIZE', 1), self.settings_dict.get('POOL_MAX_SIZE', 10),
+                    timeout=self.settings_dict.get('POOL_TIMEOUT', 30), **conn_params,
+                )
+            return _pools[key]
+
+    def get_new_connection(self, conn_params):
+        self.pool = self.get_pool(conn_params)
+        connection = self.pool.getconn()
+        if self.settings_dict.get('CONN_HEALTH_CHECKS') and not self.is_usable_connection(connection):
+            self.pool.putconn(connection, close=True)
+            connection = self.pool.getconn()
+
+        # As in the postgresql backend, which opens its connections with psycopg2.connect()
+        options = self.settings_dict['OPTIONS']
+        self.isolation_level = options.get('isolation_level', connection.isolation_level)
+        if self.isolation_level != connection.isolation_level:
+            connection.set_session(isolation_level=self.isolation_level)
+        psycopg2.extras.register_default_jsonb(conn_or_curs=connection, loads=lambda x: x)
+        return connection
+
+    def is_usable_connection(self, connection):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            # Outside autocommit the probe opened a transaction, and Django can't switch autocommit on inside one
+            if not connection.autocommit:
+                connection.rollback()
+        except psycopg2.Error:
+            return False
+        return True
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                # The pool rolls back anything left open; a broken connection is dropped rather than reused
+                self.pool.putconn(self.connection, close=bool(self.connection.closed))
@@ -0,0 +1,56 @@
+import datetime
+
+from django.db import transaction
+from django.db.models import Count, DateField, ExpressionWrapper, F, Max, Sum
+from django.utils import timezone
+
+from . import rollups, stats_cache
+
+
+def refresh_derived(user, keys, removed=None):
+    # QuerySet.update() skips the model signals and a deferred delete() skips their rollup updates, so the
+    # rollup rows the batch touched are recomputed once
+    rollups.refresh(user, keys, removed)
+    stats_cache.invalidate(user.pk)
+
+
+def _sessions(user, sessions):
+    # Always scoped to the user, whatever the caller selected; the ordering has no place in an UPDATE or DELETE
+    return sessions.filter(user=user).order_by()
+
+
+@transaction.atomic
+def reassign(user, sessions, **fields):
+    """Moves the sessions to another instrument and/or piece (instrument=..., piece=...) in one UPDATE."""
+    sessions = _sessions(user, sessions)
+    keys = rollups.affected(sessions)
+    # update() bypasses auto_now, and the cached list rows are keyed on updated_at
+    count = sessions.update(updated_at=timezone.now(), **fields)
+    if count:
+        refresh_derived(user, keys | rollups.moved(keys, fields))
+    return count
+
+
+@transaction.atomic
+def shift_dates(user, sessions, days):
+    sessions = _sessions(user, sessions)
+    keys = rollups.affected(sessions)
+    count = sessions.update(
+        date=ExpressionWrapper(F('date') + datetime.timedelta(days=days), output_field=DateField()),
+        updated_at=timezone.now(),
+    )
+    if count:
+        refresh_derived(user, keys | rollups.moved(keys, days=days))
+    return count
+
+
+@transaction.atomic
+def delete(user, sessions):
+    sessions = _sessions(user, sessions)
+    keys = rollups.affected(sessions)
+    removed = sessions.aggregate(total_duration=Sum('duration'), session_count=Count('id'), longest_session=Max('duration'))
+    with rollups.deferred():
+        count, _ = sessions.delete()
+    if count:
+        refresh_derived(user, keys, removed)
+    return count
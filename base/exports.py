@@ -0,0 +1,103 @@
+import csv
+import io
+import json
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:
+    pyarrow = None
+
+COLUMNS = ('date', 'duration', 'instrument', 'piece', 'notes')
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'jsonl': ('application/x-ndjson', 'jsonl'),
+    'arrow': ('application/vnd.apache.arrow.stream', 'arrows'),
+}
+CHUNK_SIZE = 2000
+
+
+def available_formats():
+    return [format for format in FORMATS if format != 'arrow' or pyarrow is not None]
+
+
+def format_duration(duration):
+    # Same h:mm:ss shape the importer reads back
+    total = int(duration.total_seconds())
+    return f"{total // 3600}:{total % 3600 // 60:02}:{total % 60:02}"
+
+
+def export_rows(queryset, chunk_size=CHUNK_SIZE):
+    # Plain tuples straight off a server-side cursor; instrument and piece names come from the join
+    return queryset.order_by('date', 'id').values_list('date', 'duration', 'instrument__name', 'piece__name', 'notes').iterator(chunk_size=chunk_size)
+
+
+def stream_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for date, duration, instrument, piece, notes in rows:
+        writer.writerow((date.isoformat(), format_duration(duration), instrument or '', piece or '', notes or ''))
+        if buffer.tell() > 64 * 1024:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def stream_jsonl(rows):
+    for date, duration, instrument, piece, notes in rows:
+        yield json.dumps({
+            'date': date.isoformat(),
+            'duration': format_duration(duration),
+            'instrument': instrument,
+            'piece': piece,
+            'notes': notes,
+        }) + '\n'
+
+
+def stream_arrow(rows, chunk_size=CHUNK_SIZE):
+    # Arrow IPC stream: one record batch per chunk, flushed as soon as it is written
+    schema = pyarrow.schema([
+        ('date', pyarrow.date32()),
+        ('duration', pyarrow.duration('us')),
+        ('instrument', pyarrow.string()),
+        ('piece', pyarrow.string()),
+        ('notes', pyarrow.string()),
+    ])
+    sink = io.BytesIO()
+    writer = pyarrow.ipc.new_stream(sink, schema)
+
+    def drain():
+        data = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return data
+
+    columns = [[] for _ in COLUMNS]
+    for row in rows:
+        for column, value in zip(columns, row):
+            column.append(value)
+        if len(columns[0]) >= chunk_size:
+            writer.write_batch(pyarrow.record_batch(columns, schema=schema))
+            columns = [[] for _ in COLUMNS]
+            yield drain()
+    if columns[0]:
+        writer.write_batch(pyarrow.record_batch(columns, schema=schema))
+    writer.close()
+    yield drain()
+
+
+def stream_export(queryset, format, chunk_size=CHUNK_SIZE):
+    if format not in available_formats():
+        raise ValueError(f"Unsupported export format '{format}'")
+    return stream_rows(export_rows(queryset, chunk_size=chunk_size), format, chunk_size=chunk_size)
+
+
+def stream_rows(rows, format, chunk_size=CHUNK_SIZE):
+    # Encodes rows shaped like export_rows() yields them
+    if format == 'csv':
+        return stream_csv(rows)
+    if format == 'jsonl':
+        return stream_jsonl(rows)
+    return stream_arrow(rows, chunk_size=chunk_size)
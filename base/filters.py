@@ -4,7 +4,11 @@ import django_filters
 from django_filters import filters
 from .models import Practice, Piece, User, Instrument
 from django.forms.widgets import DateTimeInput, Select, SplitDateTimeWidget, SelectDateWidget, TextInput
+from django.urls import reverse_lazy
 from durationwidget.widgets import TimeDurationWidget
+from . import search
+from .widgets import AutocompleteSelect
+from django_filters.constants import EMPTY_VALUES
 
 def instruments(request):
     if request is None:
@@ -16,26 +20,37 @@ def pieces(request):
         return Piece.objects.none()
     return Piece.objects.filter(user=request.user)
 
+class SearchFilter(filters.CharFilter):
+    # Word-prefix match through the full-text index instead of a LIKE '%x%' scan
+    def filter(self, qs, value):
+        if value in EMPTY_VALUES:
+            return qs
+        return search.filter_queryset(qs, value, fields=(self.field_name,))
+
 class PracticeFilter(django_filters.FilterSet):
     
     start_date = filters.DateFilter(field_name='date', lookup_expr='gte', label='Date from', widget=SelectDateWidget(years=range(2015, 2030), attrs={'class': 'filter-field session-start-date'}))
     end_date = filters.DateFilter(field_name='date', lookup_expr='lte', label='Date till', widget=SelectDateWidget(years=range(2015, 2030), attrs={'class': 'filter-field session-end-date'}))
     min_duration = filters.DurationFilter(field_name='duration', lookup_expr='gte', label='Duration from', widget=TimeDurationWidget(show_days=False, show_hours=True, show_minutes=True, show_seconds=False, attrs={'class': 'filter-field session-duration-min'}))
     max_duration = filters.DurationFilter(field_name='duration', lookup_expr='lte', label='Duration till', widget=TimeDurationWidget(show_days=False, show_hours=True, show_minutes=True, show_seconds=False, attrs={'class': 'filter-field session-duration-max'}))
-    piece = filters.ModelChoiceFilter(queryset=pieces, widget=Select(attrs={'class': 'filter-field session-piece'}))
-    instrument = filters.ModelChoiceFilter(queryset=instruments, widget=Select(attrs={'class': 'filter-field session-instrument'}))
-    notes = filters.CharFilter(lookup_expr='icontains', label='Notes', widget=TextInput(attrs={'class': 'filter-field session-notes'}))
+    piece = filters.ModelChoiceFilter(queryset=pieces, widget=AutocompleteSelect(reverse_lazy('api piece autocomplete'), attrs={'class': 'filter-field session-piece'}))
+    instrument = filters.ModelChoiceFilter(queryset=instruments, widget=AutocompleteSelect(reverse_lazy('api instrument autocomplete'), attrs={'class': 'filter-field session-instrument'}))
+    notes = SearchFilter(label='Notes', widget=TextInput(attrs={'class': 'filter-field session-notes'}))
 
 
     class Meta:
         model = Practice
         fields = ('instrument', 'piece', 'notes')
 
+    def filter_queryset(self, queryset):
+        # Every session row shows its instrument and piece, so load them in the same query
+        return super().filter_queryset(queryset).select_related('instrument', 'piece')
+
 class PieceFilter(django_filters.FilterSet):
-    name = filters.CharFilter(lookup_expr='icontains', label='Name:', widget=TextInput(attrs={'class': 'filter-field piece-name'}))
-    artist = filters.CharFilter(lookup_expr='icontains', label='Artist', widget=TextInput(attrs={'class': 'filter-field piece-artist'}))
-    album = filters.CharFilter(lookup_expr='icontains', label='Album', widget=TextInput(attrs={'class': 'filter-field piece-album'}))
-    notes = filters.CharFilter(lookup_expr='icontains', label='Notes', widget=TextInput(attrs={'class': 'filter-field piece-notes'}))
+    name = SearchFilter(label='Name:', widget=TextInput(attrs={'class': 'filter-field piece-name'}))
+    artist = SearchFilter(label='Artist', widget=TextInput(attrs={'class': 'filter-field piece-artist'}))
+    album = SearchFilter(label='Album', widget=TextInput(attrs={'class': 'filter-field piece-album'}))
+    notes = SearchFilter(label='Notes', widget=TextInput(attrs={'class': 'filter-field piece-notes'}))
 
     class Meta:
         model = Piece
@@ -43,9 +58,9 @@ class PieceFilter(django_filters.FilterSet):
 
 
 class InstrumentFilter(django_filters.FilterSet):
-    name = filters.CharFilter(lookup_expr='icontains', label='Name:', widget=TextInput(attrs={'class': 'filter-field instrument-name'}))
-    notes = filters.CharFilter(lookup_expr='icontains', label='Notes', widget=TextInput(attrs={'class': 'filter-field instrument-notes'}))
+    name = SearchFilter(label='Name:', widget=TextInput(attrs={'class': 'filter-field instrument-name'}))
+    notes = SearchFilter(label='Notes', widget=TextInput(attrs={'class': 'filter-field instrument-notes'}))
 
     class Meta:
-        model = Piece
+        model = Instrument
         fields = ('name', 'notes')
@@ -0,0 +1,58 @@
+from django import forms
+from django.forms.widgets import Select
+from django.urls import reverse_lazy
+
+from .importers import FORMATS
+from .models import Instrument, Piece, Practice
+from .widgets import AutocompleteSelect
+
+
+class ImportForm(forms.Form):
+    file = forms.FileField(widget=forms.ClearableFileInput(attrs={'class': 'create-field import-file'}))
+    format = forms.ChoiceField(
+        choices=[('', 'Detect from file name')] + [(format, format.upper()) for format in FORMATS],
+        required=False,
+        widget=Select(attrs={'class': 'create-field import-format'}),
+    )
+
+
+class BulkActionForm(forms.Form):
+    # Applies one change to the checked sessions, or to every session matching the list's filter
+    ACTIONS = [('reassign', 'Change instrument or piece'), ('shift', 'Move dates'), ('delete', 'Delete')]
+    max_shift = 3660
+
+    action = forms.ChoiceField(choices=ACTIONS, widget=Select(attrs={'class': 'filter-field bulk-action'}))
+    sessions = forms.ModelMultipleChoiceField(queryset=Practice.objects.none(), required=False, widget=forms.MultipleHiddenInput)
+    matching = forms.BooleanField(required=False, label='All sessions matching the filter', widget=forms.CheckboxInput(attrs={'class': 'bulk-matching'}))
+    instrument = forms.ModelChoiceField(queryset=Instrument.objects.none(), required=False, widget=AutocompleteSelect(reverse_lazy('api instrument autocomplete'), attrs={'class': 'filter-field bulk-instrument'}))
+    piece = forms.ModelChoiceField(queryset=Piece.objects.none(), required=False, widget=AutocompleteSelect(reverse_lazy('api piece autocomplete'), attrs={'class': 'filter-field bulk-piece'}))
+    days = forms.IntegerField(required=False, label='Days (negative moves earlier)', min_value=-max_shift, max_value=max_shift, widget=forms.NumberInput(attrs={'class': 'filter-field bulk-days'}))
+    confirm = forms.BooleanField(required=False, widget=forms.HiddenInput)
+
+    def __init__(self, *args, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['sessions'].queryset = Practice.objects.filter(user=user)
+        self.fields['instrument'].queryset = Instrument.objects.filter(user=user)
+        self.fields['piece'].queryset = Piece.objects.filter(user=user)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not cleaned_data.get('matching') and not cleaned_data.get('sessions'):
+            raise forms.ValidationError('Select some sessions first.')
+        action = cleaned_data.get('action')
+        if action == 'reassign' and not (cleaned_data.get('instrument') or cleaned_data.get('piece')):
+            raise forms.ValidationError('Choose the instrument or piece to move the sessions to.')
+        if action == 'shift' and not cleaned_data.get('days'):
+            raise forms.ValidationError('Enter how many days to move the sessions by.')
+        return cleaned_data
+
+
+class MergeForm(forms.Form):
+    # One group of duplicates: the instrument/piece to keep and the ones folded into it
+    winner = forms.ModelChoiceField(queryset=None, widget=forms.RadioSelect)
+    merge = forms.ModelMultipleChoiceField(queryset=None, widget=forms.CheckboxSelectMultiple)
+
+    def __init__(self, *args, model=None, user=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['winner'].queryset = model.objects.filter(user=user)
+        self.fields['merge'].queryset = model.objects.filter(user=user)
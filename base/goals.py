@@ -0,0 +1,41 @@
+import datetime
+
+from django.db.models import Q
+
+from .analytics import bucket_start
+from .models import Goal, PeriodTotal
+
+
+def with_progress(goals, user, today=None):
+    """Sets `done`, `percent` and `met` on each goal from the PeriodTotal rollup.
+
+    One query covers any number of goals: it reads this week's and this month's rows, of which there is at most
+    one per instrument and piece practised in them, whatever the size of the history.
+    """
+    goals = list(goals)
+    if not goals:
+        return goals
+    today = today or datetime.date.today()
+    rows = PeriodTotal.objects.filter(
+        Q(period='week', start=bucket_start(today, 'week')) | Q(period='month', start=bucket_start(today, 'month')),
+        user=user,
+    ).values_list('period', 'instrument_id', 'piece_id', 'total_duration')
+    done = {(period, instrument_id, piece_id): total for period, instrument_id, piece_id, total in rows}
+    for goal in goals:
+        goal.done = done.get((goal.period, goal.instrument_id, goal.piece_id), datetime.timedelta(0))
+        goal.percent = min(100, int(100 * goal.done / goal.target)) if goal.target else 100
+        goal.met = goal.done >= goal.target
+    return goals
+
+
+def goals_for(user, today=None, **subject):
+    # The user's goals on one instrument or piece (instrument=..., piece=...), with their progress
+    return with_progress(Goal.objects.filter(user=user, **subject), user, today)
+
+
+def goals_by_subject(user, field, today=None):
+    # Every goal on the user's instruments (field='instrument') or pieces, keyed by their id, for the list pages
+    grouped = {}
+    for goal in with_progress(Goal.objects.filter(user=user, **{f"{field}__isnull": False}), user, today):
+        grouped.setdefault(getattr(goal, f"{field}_id"), []).append(goal)
+    return grouped
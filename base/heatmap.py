@@ -0,0 +1,75 @@
+import datetime
+
+import numpy
+
+from .models import DailyTotal
+from .templatetags.modulo import time
+
+WEEKS = 53
+DAYS = 7
+LEVELS = 4
+CELL = 13
+LABEL_HEIGHT = 14
+MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+
+def grid_start(today):
+    # The grid ends with the week holding today; weeks run Monday to Sunday like the weekly analytics buckets
+    return today - datetime.timedelta(days=today.weekday(), weeks=WEEKS - 1)
+
+
+def daily_seconds(user, start, end):
+    # The per-day rollup is already the (date, sum(duration)) grouping, one row per practiced day
+    rows = list(DailyTotal.objects.filter(user=user, date__range=(start, end)).values_list('date', 'total_duration'))
+    dates = numpy.array([date for date, _ in rows], dtype='datetime64[D]')
+    seconds = numpy.array([duration.total_seconds() for _, duration in rows], dtype=numpy.int64)
+    return dates, seconds
+
+
+def build_grid(dates, seconds, start):
+    """Scatters per-day seconds into a 7x53 grid (weekday x week), day 0 being the Monday `start`."""
+    grid = numpy.zeros(WEEKS * DAYS, dtype=numpy.int64)
+    offsets = (dates - numpy.datetime64(start, 'D')).astype(numpy.int64)
+    inside = (offsets >= 0) & (offsets < WEEKS * DAYS)
+    numpy.add.at(grid, offsets[inside], seconds[inside])
+    return grid.reshape(WEEKS, DAYS).T
+
+
+def levels(grid):
+    # Colour level 0 for no practice, then 1..LEVELS by quartile of the practiced days
+    practiced = grid[grid > 0]
+    if not practiced.size:
+        return numpy.zeros_like(grid)
+    edges = numpy.quantile(practiced, numpy.linspace(0, 1, LEVELS + 1)[1:-1])
+    return numpy.where(grid > 0, numpy.searchsorted(edges, grid, side='left') + 1, 0)
+
+
+def heatmap(user, today=None):
+    """Everything the heatmap partial needs for the year ending today, as plain lists that cache well."""
+    today = today or datetime.date.today()
+    start = grid_start(today)
+    grid = build_grid(*daily_seconds(user, start, today), start)
+    shades = levels(grid)
+
+    days = (numpy.datetime64(start, 'D') + numpy.arange(WEEKS * DAYS)).reshape(WEEKS, DAYS).T
+    visible = days <= numpy.datetime64(today, 'D')
+    rows, columns = numpy.nonzero(visible)
+    seconds = grid[visible]
+    labels = numpy.datetime_as_string(days[visible])
+    cells = [
+        {'x': column * CELL, 'y': LABEL_HEIGHT + row * CELL, 'level': shade, 'label': f"{time(datetime.timedelta(seconds=total))} on {label}" if total else f"No practice on {label}"}
+        for row, column, total, shade, label in zip(rows.tolist(), columns.tolist(), seconds.tolist(), shades[visible].tolist(), labels.tolist())
+    ]
+
+    # A month label above the first week that starts in that month
+    months = days[0].astype('datetime64[M]')
+    firsts = numpy.flatnonzero(numpy.diff(months.astype(numpy.int64), prepend=-1) != 0)
+    month_labels = [{'x': column * CELL, 'name': MONTHS[int(months[column].astype(numpy.int64)) % 12]} for column in firsts.tolist()]
+
+    return {
+        'cells': cells,
+        'months': month_labels,
+        'total': time(datetime.timedelta(seconds=int(grid.sum()))),
+        'width': WEEKS * CELL,
+        'height': LABEL_HEIGHT + DAYS * CELL,
+    }
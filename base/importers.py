@@ -0,0 +1,158 @@
+import csv
+import datetime
+import itertools
+import json
+import re
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils.dateparse import parse_date, parse_duration
+
+from . import rollups, stats_cache
+from .models import Instrument, Piece, Practice
+from .validators import validate_duration
+
+FORMATS = ('csv', 'json')
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.errors = []
+
+    def add_error(self, row_number, message):
+        self.errors.append((row_number, message))
+
+
+def guess_format(filename):
+    if filename.lower().endswith(('.json', '.jsonl', '.ndjson')):
+        return 'json'
+    return 'csv'
+
+
+def read_csv(stream):
+    yield from csv.DictReader(stream)
+
+
+def read_json(stream):
+    # Either a JSON array of objects or JSON Lines; JSON Lines is read one line at a time
+    first = stream.read(1)
+    while first and first.isspace():
+        first = stream.read(1)
+    if first == '[':
+        yield from json.loads(first + stream.read())
+        return
+    for line in itertools.chain([first + stream.readline()], stream):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            # Reported as a bad row rather than ending the import
+            yield None
+
+
+def read_rows(stream, format):
+    if format == 'json':
+        return read_json(stream)
+    return read_csv(stream)
+
+
+def parse_row_duration(value):
+    # Spreadsheets tend to hold minutes ("45") or hours:minutes ("1:30"); anything else goes through Django's parser
+    value = str(value).strip()
+    try:
+        if re.fullmatch(r'[0-9]+', value):
+            return datetime.timedelta(minutes=int(value))
+        parts = value.split(':')
+        if len(parts) in (2, 3) and all(re.fullmatch(r'[0-9]+', part) for part in parts):
+            hours, minutes, seconds = (int(part) for part in (parts + ['0'])[:3])
+            return datetime.timedelta(hours=hours, minutes=minutes, seconds=seconds)
+        duration = parse_duration(value)
+    except OverflowError:
+        raise ValidationError(f"'{value}' is too long a duration")
+    if duration is None:
+        raise ValidationError(f"'{value}' is not a duration")
+    return duration
+
+
+def parse_row(row):
+    if not isinstance(row, dict):
+        raise ValidationError("row is not a JSON object")
+    try:
+        date = parse_date(str(row.get('date') or '').strip())
+    except ValueError:
+        # Well formed but impossible, like 2021-02-30
+        date = None
+    if date is None:
+        raise ValidationError(f"'{row.get('date')}' is not a date (use YYYY-MM-DD)")
+    duration = parse_row_duration(row.get('duration') or '')
+    validate_duration(duration)
+    notes = row.get('notes') or None
+    if notes is not None and not isinstance(notes, str):
+        raise ValidationError("notes must be text")
+    return {
+        'date': date,
+        'duration': duration,
+        'instrument': str(row.get('instrument') or '').strip(),
+        'piece': str(row.get('piece') or '').strip(),
+        'notes': notes,
+    }
+
+
+class NameLookup:
+    # Maps names to the user's instruments/pieces, creating missing ones on first sight
+    def __init__(self, model, user):
+        self.model = model
+        self.user = user
+        self.objects = {}
+        for obj in model.objects.filter(user=user).order_by('-pk'):
+            self.objects[obj.name.lower()] = obj
+
+    def get(self, name):
+        if not name:
+            return None
+        key = name.lower()
+        if key not in self.objects:
+            self.objects[key] = self.model.objects.create(user=self.user, name=name[:100])
+        return self.objects[key]
+
+
+def import_sessions(user, rows, batch_size=500):
+    result = ImportResult()
+    instruments = NameLookup(Instrument, user)
+    pieces = NameLookup(Piece, user)
+    batch = []
+
+    def flush():
+        with transaction.atomic():
+            Practice.objects.bulk_create(batch, batch_size=batch_size)
+        result.created += len(batch)
+        batch.clear()
+
+    try:
+        for row_number, row in enumerate(rows, start=1):
+            try:
+                values = parse_row(row)
+            except ValidationError as error:
+                result.add_error(row_number, '; '.join(error.messages))
+                continue
+            batch.append(Practice(
+                user=user,
+                date=values['date'],
+                duration=values['duration'],
+                instrument=instruments.get(values['instrument']),
+                piece=pieces.get(values['piece']),
+                notes=values['notes'],
+            ))
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+    finally:
+        # bulk_create skips the model signals, so the derived tables are refreshed once for the whole import,
+        # including the batches that went in before an unreadable file ended it
+        if result.created:
+            rollups.rebuild(user)
+            stats_cache.invalidate(user.pk)
+    return result
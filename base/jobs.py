@@ -0,0 +1,191 @@
+import datetime
+import io
+import tempfile
+import time
+import traceback
+import types
+
+from django.conf import settings
+from django.core.files import File
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Count, F
+from django.http import QueryDict
+from django.utils import timezone
+
+from . import exports, rollups, stats_cache
+from .filters import PracticeFilter
+from .importers import import_sessions, read_rows
+from .models import DataVersion, Job, Practice
+
+HANDLERS = {}
+# Rows between progress updates for the jobs that walk a list of rows
+PROGRESS_EVERY = 500
+
+
+def handler(kind, max_attempts=None):
+    """Registers a function taking (job, report) as the code run for jobs of this kind.
+
+    Its return value, which must be JSON serializable, becomes the job's result. Jobs that are not safe to
+    run twice (max_attempts=1) are never retried.
+    """
+    def register(func):
+        HANDLERS[kind] = (func, max_attempts)
+        return func
+    return register
+
+
+def enqueue(user, kind, payload=None, **params):
+    if kind not in HANDLERS:
+        raise ValueError(f"Unknown job kind '{kind}'")
+    max_attempts = HANDLERS[kind][1] or settings.JOB_MAX_ATTEMPTS
+    return Job.objects.create(user=user, kind=kind, params=params, payload=payload, max_attempts=max_attempts)
+
+
+class Progress:
+    # Passed to handlers as `report(fraction, message)`; writes at most once a second, which doubles as the heartbeat
+    interval = 1.0
+
+    def __init__(self, job):
+        self.job = job
+        self.written = 0
+
+    def __call__(self, fraction, message=''):
+        now = time.monotonic()
+        if now - self.written < self.interval:
+            return
+        self.written = now
+        Job.objects.filter(pk=self.job.pk).update(progress=min(max(fraction, 0), 1), message=message[:200], heartbeat=timezone.now())
+
+
+def requeue_stale(timeout=None):
+    # Jobs whose worker stopped sending heartbeats (it crashed or was killed) count as a failed attempt
+    cutoff = timezone.now() - datetime.timedelta(seconds=timeout or settings.JOB_TIMEOUT)
+    stale = Job.objects.filter(status='running', heartbeat__lt=cutoff)
+    stale.filter(attempts__lt=F('max_attempts')).update(status='queued', worker='', message='Worker lost, retrying')
+    stale.update(status='failed', error='Worker lost', finished_at=timezone.now())
+
+
+def claim(worker, per_user_limit=None):
+    """Marks the oldest runnable job as running for this worker and returns it, or None.
+
+    Users already running `per_user_limit` jobs are skipped. The limit is checked inside the claiming UPDATE,
+    and on databases with row locks the user's DataVersion row is locked first, so two workers can't both
+    take a user's last free slot.
+    """
+    per_user_limit = per_user_limit or settings.JOBS_PER_USER_LIMIT
+    now = timezone.now()
+    busy = Job.objects.filter(status='running').order_by().values('user_id').annotate(running=Count('id')).filter(running__gte=per_user_limit).values('user_id')
+    candidates = Job.objects.filter(status='queued', run_after__lte=now).exclude(user_id__in=busy).order_by('run_after', 'id').values_list('pk', 'user_id')[:10]
+    for pk, user_id in candidates:
+        with transaction.atomic():
+            if connection.features.has_select_for_update:
+                list(DataVersion.objects.select_for_update().filter(user_id=user_id))
+            claimed = Job.objects.filter(pk=pk, status='queued').exclude(user_id__in=busy).update(
+                status='running', worker=worker, heartbeat=now, attempts=F('attempts') + 1,
+            )
+        if claimed:
+            return Job.objects.select_related('user').get(pk=pk)
+    return None
+
+
+def run(job):
+    func, _ = HANDLERS[job.kind]
+    try:
+        result = func(job, Progress(job))
+    except Exception:
+        error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            delay = settings.JOB_RETRY_DELAY * 2 ** (job.attempts - 1)
+            Job.objects.filter(pk=job.pk).update(
+                status='queued', error=error, worker='', message=f"Attempt {job.attempts} failed, retrying",
+                run_after=timezone.now() + datetime.timedelta(seconds=delay),
+            )
+        else:
+            Job.objects.filter(pk=job.pk).update(status='failed', error=error, message='Failed', finished_at=timezone.now())
+        return
+    Job.objects.filter(pk=job.pk).update(status='done', progress=1, message='Done', result=result, finished_at=timezone.now())
+
+
+def run_next(worker, per_user_limit=None):
+    # One claim-and-run cycle; jobs get the same fresh-connection treatment as requests
+    close_old_connections()
+    try:
+        requeue_stale()
+        job = claim(worker, per_user_limit)
+        if job is not None:
+            run(job)
+        return job
+    finally:
+        close_old_connections()
+
+
+def work(worker, poll_interval=1.0, per_user_limit=None, burst=False, should_stop=lambda: False):
+    """Runs jobs until should_stop() (or, with burst, until the queue is empty); returns how many ran."""
+    processed = 0
+    while not should_stop():
+        if run_next(worker, per_user_limit) is not None:
+            processed += 1
+        elif burst:
+            break
+        else:
+            time.sleep(poll_interval)
+    return processed
+
+
+def job_to_dict(job):
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'progress': job.progress,
+        'message': job.message,
+        'result': job.result,
+        'attempts': job.attempts,
+        'created_at': job.created_at,
+        'finished_at': job.finished_at,
+    }
+
+
+def counted(rows, total, report, message):
+    for number, row in enumerate(rows, start=1):
+        if number % PROGRESS_EVERY == 0:
+            report(number / total, message)
+        yield row
+
+
+@handler('rebuild_rollups')
+def rebuild_rollups(job, report):
+    # Scaled so the verification keeps the last tenth
+    rollups.rebuild(job.user, report=lambda fraction, message: report(0.9 * fraction, message))
+    stats_cache.invalidate(job.user_id)
+    report(0.9, 'Verifying totals')
+    return {'problems': rollups.verify(job.user)}
+
+
+# Importing twice would duplicate every session that went in before the failure
+@handler('import_sessions', max_attempts=1)
+def import_sessions_job(job, report):
+    rows = list(read_rows(io.StringIO(bytes(job.payload).decode('utf-8-sig'), newline=''), job.params['format']))
+    result = import_sessions(job.user, counted(rows, len(rows), report, 'Importing sessions'))
+    Job.objects.filter(pk=job.pk).update(payload=None)
+    return {'created': result.created, 'errors': result.errors}
+
+
+@handler('export_sessions')
+def export_sessions_job(job, report):
+    format = job.params['format']
+    # The same filters as the practice list, from the query string the export was requested with
+    request = types.SimpleNamespace(user=job.user)
+    queryset = PracticeFilter(QueryDict(job.params.get('filters', '')), queryset=Practice.objects.filter(user=job.user), request=request).qs
+    total = queryset.count() or 1
+    rows = counted(exports.export_rows(queryset), total, report, 'Exporting sessions')
+    content_type, extension = exports.FORMATS[format]
+    # Spooled to a temporary file a chunk at a time, like the streamed download, then handed to the storage
+    with tempfile.TemporaryFile() as output:
+        for chunk in exports.stream_rows(rows, format):
+            output.write(chunk.encode() if isinstance(chunk, str) else chunk)
+        size = output.tell()
+        output.seek(0)
+        job.output.save(f"studiolog-sessions-{job.pk}.{extension}", File(output), save=False)
+    Job.objects.filter(pk=job.pk).update(output=job.output.name)
+    return {'filename': f"studiolog-sessions.{extension}", 'content_type': content_type, 'bytes': size}
@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import CommandError
+from django.db import connection
+
+from base.seed import seed_user
+
+from .benchmark_stacks import Command as StacksCommand
+
+# The environment each gunicorn run gets; see "Database connections" in StudioLog/settings.py
+MODES = {
+    'per-request': {'DB_CONN_MAX_AGE': '0'},
+    'persistent': {'DB_CONN_MAX_AGE': '600'},
+    'persistent-checked': {'DB_CONN_MAX_AGE': '600', 'DB_HEALTH_CHECKS': 'True'},
+    'pool': {'DB_POOL': 'True'},
+    'pool-checked': {'DB_POOL': 'True', 'DB_HEALTH_CHECKS': 'True'},
+}
+
+
+class Command(StacksCommand):
+    help = 'Serves the same seeded user from gunicorn with each database connection mode and compares page latencies (PostgreSQL only)'
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--modes', nargs='+', choices=list(MODES), default=list(MODES))
+        parser.add_argument('--threads', type=int, default=1, help='gunicorn threads per worker; the pool is shared by a worker\'s threads')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Set DATABASE_URL to a PostgreSQL database (and DB_SSL_REQUIRE=False for a local one)')
+        user = User.objects.filter(username=options['username']).first()
+        if user is None:
+            self.stdout.write(f"Seeding {options['sessions']} sessions for {options['username']}")
+            user = seed_user(options['username'], sessions=options['sessions'], seed=0)
+        urls = self.page_urls(user)
+        cookie = f"{settings.SESSION_COOKIE_NAME}={self.session_key(user)}"
+        arguments = ['--threads', str(options['threads']), 'StudioLog.wsgi']
+
+        try:
+            results = {mode: self.run_server(arguments, MODES[mode], urls, cookie, options) for mode in options['modes']}
+        finally:
+            if options['cleanup']:
+                user.delete()
+        self.report('mode', results)
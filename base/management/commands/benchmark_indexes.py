@@ -0,0 +1,69 @@
+import datetime
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from base.models import Practice
+from base.seed import seed_user
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Seeds a large practice history and checks that the app\'s query shapes are planned on the composite indexes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sessions', type=int, default=100000)
+        parser.add_argument('--users', type=int, default=5, help='Users sharing the table, so the user filter is selective')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed runs per query')
+        parser.add_argument('--keep', action='store_true', help='Keep the seeded data instead of rolling it back')
+
+    def query_shapes(self, user):
+        sessions = Practice.objects.filter(user=user)
+        instrument = user.instrument_set.first()
+        piece = user.piece_set.first()
+        today = datetime.date.today()
+        return [
+            ('practice list', sessions.order_by('-date', '-id')[:50], 'practice_user_date_idx'),
+            ('date range filter', sessions.filter(date__gte=today - datetime.timedelta(days=30), date__lte=today).order_by('-date'), 'practice_user_date_idx'),
+            ('instrument sessions', sessions.filter(instrument=instrument).order_by('-date'), 'practice_user_instrument_idx'),
+            ('piece sessions', sessions.filter(piece=piece).order_by('-date'), 'practice_user_piece_idx'),
+            # Duration ranges feed the filtered stats aggregates, which drop the date ordering
+            ('duration filter', sessions.filter(duration__gte=datetime.timedelta(hours=2, minutes=55)).order_by(), 'practice_user_duration_idx'),
+            ('longest session', sessions.order_by('-duration')[:1], 'practice_user_duration_idx'),
+        ]
+
+    def analyze(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"ANALYZE {Practice._meta.db_table}")
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Seeding {options['sessions']} sessions on {connection.vendor}")
+        failures = []
+        try:
+            with transaction.atomic():
+                per_user = options['sessions'] // options['users']
+                users = [seed_user(f"benchmark-indexes-{n}", sessions=per_user, seed=n) for n in range(options['users'])]
+                self.analyze()
+                for name, queryset, index in self.query_shapes(users[0]):
+                    plan = queryset.explain()
+                    start = time.perf_counter()
+                    for _ in range(options['repeat']):
+                        list(queryset)
+                    elapsed = (time.perf_counter() - start) / options['repeat'] * 1000
+                    used = index in plan
+                    if not used:
+                        failures.append(name)
+                    self.stdout.write(f"{name:<22} {elapsed:8.2f} ms  {'uses' if used else 'MISSES'} {index}")
+                    self.stdout.write('    ' + plan.replace('\n', '\n    '))
+                if not options['keep']:
+                    raise Rollback()
+        except Rollback:
+            pass
+
+        if failures:
+            raise CommandError(f"Queries not using their index: {', '.join(failures)}")
+        self.stdout.write(self.style.SUCCESS('All query shapes use their composite index'))
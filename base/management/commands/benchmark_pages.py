@@ -0,0 +1,122 @@
+import json
+import statistics
+import subprocess
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import URLPattern, reverse
+
+from base import stats_cache, urls
+from base.models import Goal, Instrument, Job, Piece, Practice
+from base.seed import seed_user
+
+# Which of the user's objects fills the <pk> of a detail/edit URL, by URL name prefix
+PK_MODELS = {'practice': Practice, 'goal': Goal, 'job': Job, 'api job': Job, 'instrument': Instrument, 'piece': Piece, 'api practice': Practice, 'api instrument': Instrument, 'api piece': Piece}
+
+
+class Rollback(Exception):
+    pass
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, cwd=settings.BASE_DIR, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = 'Requests every page in base/urls.py through the test client and writes a JSON report of time, queries and size per page'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', help='Benchmark an existing user (e.g. one made by seed_studiolog) instead of seeding one')
+        parser.add_argument('--sessions', type=int, default=10000, help='Sessions to seed when no --username is given; rolled back afterwards')
+        parser.add_argument('--repeat', type=int, default=5, help='Warm requests per page, after the first (cold) one')
+        parser.add_argument('--output', help='Write the report here instead of stdout')
+
+    def handle(self, *args, **options):
+        setup_test_environment()
+        try:
+            # Static URLs resolve without a collectstatic manifest
+            with override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage'):
+                report = self.run(options)
+        finally:
+            teardown_test_environment()
+
+        output = json.dumps(report, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Wrote {len(report['pages'])} pages to {options['output']}"))
+        else:
+            self.stdout.write(output)
+
+    def run(self, options):
+        if options['username']:
+            user = User.objects.filter(username=options['username']).first()
+            if user is None:
+                raise CommandError(f"No user named {options['username']}")
+            return self.benchmark(user, options)
+        report = None
+        try:
+            with transaction.atomic():
+                user = seed_user('benchmark-pages', sessions=options['sessions'], seed=0)
+                report = self.benchmark(user, options)
+                raise Rollback
+        except Rollback:
+            pass
+        return report
+
+    def page_urls(self, user):
+        for pattern in urls.urlpatterns:
+            if not isinstance(pattern, URLPattern) or pattern.name == 'logout':
+                continue
+            if 'pk' in pattern.pattern.converters:
+                model = PK_MODELS[pattern.name.rsplit(' ', 1)[0]]
+                pk = model.objects.filter(user=user).order_by('pk').values_list('pk', flat=True).first()
+                if pk is None:
+                    continue
+                yield pattern.name, reverse(pattern.name, kwargs={'pk': pk})
+            else:
+                yield pattern.name, reverse(pattern.name)
+
+    def request(self, client, url):
+        # The query log is capped, so a long run would otherwise stop counting
+        connection.queries_log.clear()
+        start = time.perf_counter()
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+            body = b''.join(response.streaming_content) if response.streaming else response.content
+        return (time.perf_counter() - start) * 1000, len(queries), len(body), response.status_code
+
+    def benchmark(self, user, options):
+        client = Client()
+        client.force_login(user)
+        caches[stats_cache.CACHE_ALIAS].clear()
+        pages = {}
+        for name, url in self.page_urls(user):
+            cold_ms, cold_queries, size, status = self.request(client, url)
+            warm = [self.request(client, url) for _ in range(options['repeat'])]
+            pages[name] = {
+                'url': url,
+                'status': status,
+                'bytes': size,
+                'cold_ms': round(cold_ms, 2),
+                'cold_queries': cold_queries,
+                'warm_ms': round(statistics.median(ms for ms, _, _, _ in warm), 2) if warm else None,
+                'queries': warm[-1][1] if warm else cold_queries,
+            }
+            self.stderr.write(f"{name:<28} {status} {pages[name]['warm_ms'] or cold_ms:9.2f} ms {pages[name]['queries']:4} queries {size:9} bytes")
+        return {
+            'revision': git_revision(),
+            'database': connection.vendor,
+            'user': {'sessions': Practice.objects.filter(user=user).count(), 'instruments': Instrument.objects.filter(user=user).count(), 'pieces': Piece.objects.filter(user=user).count()},
+            'repeat': options['repeat'],
+            'pages': pages,
+        }
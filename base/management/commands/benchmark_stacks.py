@@ -0,0 +1,135 @@
+import http.client
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.auth.models import User
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from base.seed import seed_user
+
+STACKS = {
+    'wsgi': (['StudioLog.wsgi'], {}),
+    'asgi': (['-c', 'gunicorn_asgi.py', 'StudioLog.asgi:application'], {'ASYNC_VIEWS': 'True'}),
+}
+
+
+def percentile(latencies, fraction):
+    ordered = sorted(latencies)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class Command(BaseCommand):
+    help = 'Serves the same seeded user from gunicorn under WSGI and under ASGI (uvicorn workers) and compares page latencies'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stacks', nargs='+', choices=list(STACKS), default=list(STACKS))
+        parser.add_argument('--username', default='benchmark-stacks')
+        parser.add_argument('--sessions', type=int, default=20000, help='Sessions to seed if the user does not exist yet')
+        parser.add_argument('--requests', type=int, default=500, help='Timed requests per stack')
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes per stack')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--cleanup', action='store_true', help='Delete the seeded user afterwards')
+
+    def handle(self, *args, **options):
+        if shutil.which('gunicorn') is None:
+            raise CommandError('gunicorn is not installed')
+        user = User.objects.filter(username=options['username']).first()
+        if user is None:
+            self.stdout.write(f"Seeding {options['sessions']} sessions for {options['username']}")
+            user = seed_user(options['username'], sessions=options['sessions'], seed=0)
+        urls = self.page_urls(user)
+        cookie = f"{settings.SESSION_COOKIE_NAME}={self.session_key(user)}"
+
+        try:
+            results = {stack: self.run_stack(stack, urls, cookie, options) for stack in options['stacks']}
+        finally:
+            if options['cleanup']:
+                user.delete()
+
+        self.report('stack', results)
+
+    def report(self, label, results):
+        width = max(len(label), *(len(name) for name in results))
+        self.stdout.write(f"{label:<{width}} {'p50 ms':>8} {'p99 ms':>8} {'mean ms':>8} {'req/s':>8}")
+        for name, (latencies, elapsed) in results.items():
+            self.stdout.write(
+                f"{name:<{width}} {percentile(latencies, 0.5):8.1f} {percentile(latencies, 0.99):8.1f} "
+                f"{statistics.mean(latencies):8.1f} {len(latencies) / elapsed:8.1f}"
+            )
+
+    def page_urls(self, user):
+        return [
+            reverse('practice list'),
+            reverse('instrument list'),
+            reverse('piece list'),
+            reverse('practice detail', args=[user.practice_set.values_list('pk', flat=True).first()]),
+            reverse('instrument detail', args=[user.instrument_set.values_list('pk', flat=True).first()]),
+            reverse('piece detail', args=[user.piece_set.values_list('pk', flat=True).first()]),
+        ]
+
+    def session_key(self, user):
+        # A stored session both servers will accept, instead of going through the login form
+        session = SessionStore()
+        session[SESSION_KEY] = str(user.pk)
+        session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+        session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+        session.save()
+        return session.session_key
+
+    def run_stack(self, stack, urls, cookie, options):
+        arguments, environment = STACKS[stack]
+        return self.run_server(arguments, environment, urls, cookie, options)
+
+    def run_server(self, arguments, environment, urls, cookie, options):
+        command = [sys.executable, '-m', 'gunicorn', '-b', f"127.0.0.1:{options['port']}", '-w', str(options['workers']), *arguments]
+        server = subprocess.Popen(command, cwd=settings.BASE_DIR, env={**os.environ, **environment}, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            self.wait_for(options['port'])
+            headers = {'Cookie': cookie, 'Host': next((host for host in settings.ALLOWED_HOSTS if host != '*'), 'localhost')}
+            # One pass per worker so every process has its connections and stats cache warm
+            self.load(urls, headers, options['port'], len(urls) * options['workers'] * 2, options['concurrency'])
+            start = time.perf_counter()
+            latencies = self.load(urls, headers, options['port'], options['requests'], options['concurrency'])
+            return latencies, time.perf_counter() - start
+        finally:
+            server.terminate()
+            server.wait()
+
+    def wait_for(self, port, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise CommandError(f"Server did not start listening on port {port}")
+
+    def load(self, urls, headers, port, requests, concurrency):
+        def client(worker):
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+            latencies = []
+            for n in range(worker, requests, concurrency):
+                start = time.perf_counter()
+                connection.request('GET', urls[n % len(urls)], headers=headers)
+                response = connection.getresponse()
+                response.read()
+                latencies.append((time.perf_counter() - start) * 1000)
+                if response.status != 200:
+                    raise CommandError(f"{urls[n % len(urls)]} returned {response.status}")
+            connection.close()
+            return latencies
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            return [latency for latencies in pool.map(client, range(concurrency)) for latency in latencies]
@@ -0,0 +1,57 @@
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from base import exports
+from base.models import Practice
+
+
+def export_user(user, format, path, chunk_size):
+    try:
+        mode = 'wb' if format == 'arrow' else 'w'
+        with open(path, mode, **({} if mode == 'wb' else {'encoding': 'utf-8', 'newline': ''})) as output:
+            for chunk in exports.stream_export(Practice.objects.filter(user=user), format, chunk_size=chunk_size):
+                output.write(chunk)
+    finally:
+        # Each worker thread has its own connection; don't leave it open when the thread is reused
+        connections.close_all()
+    return path
+
+
+class Command(BaseCommand):
+    help = "Exports every user's practice history to one file per user, several users at a time"
+
+    def add_arguments(self, parser):
+        parser.add_argument('output_dir')
+        parser.add_argument('--format', choices=list(exports.FORMATS), default='csv')
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--chunk-size', type=int, default=exports.CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        format = options['format']
+        if format not in exports.available_formats():
+            raise CommandError(f"The {format} format needs pyarrow installed")
+        os.makedirs(options['output_dir'], exist_ok=True)
+        extension = exports.FORMATS[format][1]
+
+        users = list(User.objects.filter(practice__isnull=False).distinct().order_by('pk'))
+        failures = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            futures = {
+                pool.submit(export_user, user, format, os.path.join(options['output_dir'], f"{user.pk}-{user.username}.{extension}"), options['chunk_size']): user
+                for user in users
+            }
+            for future in as_completed(futures):
+                user = futures[future]
+                try:
+                    self.stdout.write(f"Exported {user.username} to {future.result()}")
+                except Exception as error:
+                    failures += 1
+                    self.stderr.write(f"Failed to export {user.username}: {error}")
+
+        if failures:
+            raise CommandError(f"{failures} of {len(users)} exports failed")
+        self.stdout.write(self.style.SUCCESS(f"Exported {len(users)} users"))
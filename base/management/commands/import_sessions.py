@@ -0,0 +1,33 @@
+import csv
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from base.importers import FORMATS, guess_format, import_sessions, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Imports practice sessions for a user from a CSV or JSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to guessing from the file extension')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['username']} does not exist")
+
+        format = options['format'] or guess_format(options['path'])
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as stream:
+                result = import_sessions(user, read_rows(stream, format), batch_size=options['batch_size'])
+        except (OSError, ValueError, csv.Error) as error:
+            raise CommandError(f"Could not read {options['path']}: {error}")
+
+        for row_number, message in result.errors:
+            self.stderr.write(f"Row {row_number}: {message}")
+        self.stdout.write(self.style.SUCCESS(f"Imported {result.created} sessions, skipped {len(result.errors)} rows"))
@@ -0,0 +1,30 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from base import rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the practice rollup tables from the Practice table and verifies them against live aggregates'
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='*', help='Only rebuild these users (default: everyone)')
+        parser.add_argument('--check', action='store_true', help='Only verify the stored rollups, do not rebuild them')
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('pk')
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+
+        problems = []
+        for user in users.iterator():
+            if not options['check']:
+                rollups.rebuild(user)
+            user_problems = rollups.verify(user)
+            for problem in user_problems:
+                self.stderr.write(problem)
+            problems.extend(user_problems)
+
+        if problems:
+            raise CommandError(f"{len(problems)} rollup mismatches found")
+        self.stdout.write(self.style.SUCCESS('Rollups verified'))
@@ -0,0 +1,56 @@
+import os
+import signal
+import socket
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+_stopping = False
+
+
+def _stop(signum, frame):
+    global _stopping
+    _stopping = True
+
+
+def start_worker():
+    # Runs in each pool process: Django may need setting up (spawned processes), and a stop signal lets the
+    # current job finish instead of killing it halfway
+    django.setup()
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+
+def work(worker, poll_interval, per_user_limit, burst):
+    from base import jobs
+    return jobs.work(worker, poll_interval=poll_interval, per_user_limit=per_user_limit, burst=burst, should_stop=lambda: _stopping)
+
+
+class Command(BaseCommand):
+    help = 'Runs queued background jobs (imports, exports, rollup rebuilds) in a pool of worker processes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=2)
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to wait before looking again when the queue is empty')
+        parser.add_argument('--per-user-limit', type=int, default=None, help='Jobs one user may have running at once (default: JOBS_PER_USER_LIMIT)')
+        parser.add_argument('--burst', action='store_true', help='Exit once the queue is empty instead of waiting for more jobs')
+
+    def handle(self, *args, **options):
+        per_user_limit = options['per_user_limit'] or settings.JOBS_PER_USER_LIMIT
+        # Forked workers must open their own connections rather than share the parent's
+        connections.close_all()
+        prefix = f"{socket.gethostname()}:{os.getpid()}"
+        self.stdout.write(f"Starting {options['processes']} workers ({per_user_limit} job(s) per user at a time)")
+        # The workers catch SIGTERM themselves; the parent only has to wait for them to finish their jobs
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        with ProcessPoolExecutor(max_workers=options['processes'], initializer=start_worker) as pool:
+            futures = [pool.submit(work, f"{prefix}:{n}", options['poll_interval'], per_user_limit, options['burst']) for n in range(options['processes'])]
+            try:
+                processed = sum(future.result() for future in futures)
+            except KeyboardInterrupt:
+                # The workers got the same SIGINT and stop after their current job
+                processed = sum(future.result() for future in futures)
+        self.stdout.write(self.style.SUCCESS(f"Ran {processed} jobs"))
@@ -0,0 +1,49 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from base.seed import DISTRIBUTIONS, seed_users
+
+
+class Command(BaseCommand):
+    help = 'Bulk-generates users with synthetic instruments, pieces and practice sessions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--sessions', type=int, default=1000, help='Mean sessions per user')
+        parser.add_argument('--instruments', type=int, default=3, help='Mean instruments per user')
+        parser.add_argument('--pieces', type=int, default=50, help='Mean pieces per user')
+        parser.add_argument('--distribution', choices=DISTRIBUTIONS, default='lognormal', help='How the per-user counts spread around their means')
+        parser.add_argument('--days', type=int, default=3650, help='How far back the sessions go')
+        parser.add_argument('--median-minutes', type=int, default=45, help='Median session length')
+        parser.add_argument('--notes-share', type=float, default=0.2, help='Fraction of sessions with notes')
+        parser.add_argument('--prefix', default='seed', help='Usernames are <prefix>-<n>')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=None, help='Random seed, for a reproducible dataset')
+
+    def handle(self, *args, **options):
+        if User.objects.filter(username__startswith=f"{options['prefix']}-").exists():
+            raise CommandError(f"Users named {options['prefix']}-<n> already exist; pick another --prefix")
+
+        start = time.perf_counter()
+        total = 0
+        users = seed_users(
+            options['users'],
+            prefix=options['prefix'],
+            sessions=options['sessions'],
+            instruments=options['instruments'],
+            pieces=options['pieces'],
+            distribution=options['distribution'],
+            days=options['days'],
+            seed=options['seed'],
+            median_minutes=options['median_minutes'],
+            notes_share=options['notes_share'],
+            batch_size=options['batch_size'],
+        )
+        for user in users:
+            sessions = user.practice_total.session_count if hasattr(user, 'practice_total') else 0
+            total += sessions
+            self.stdout.write(f"{user.username}: {sessions} sessions")
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(f"Seeded {options['users']} users and {total} sessions in {elapsed:.1f}s ({total / elapsed if elapsed else 0:.0f} sessions/s)"))
@@ -0,0 +1,76 @@
+import itertools
+
+from django.db import transaction
+from django.db.models import Count
+from django.db.models.functions import Lower, Trim
+from django.utils import timezone
+
+from . import rollups
+from .bulk import refresh_derived
+from .models import Goal, Piece, Practice
+from .stats import with_practice_stats
+
+# Fields a merged piece takes from the duplicates when it has no value of its own
+FILL_FIELDS = {Piece: ('artist', 'album')}
+
+
+def normalized_name():
+    # The same matching the importer does in Python (NameLookup), plus surrounding spaces
+    return Lower(Trim('name'))
+
+
+def duplicate_groups(model, user):
+    """The user's instruments or pieces whose names only differ in case and surrounding spaces.
+
+    The grouping is done by the database; only the rows that have a duplicate are loaded. Each group lists
+    the most practised first, which is the one the others are merged into by default.
+    """
+    names = model.objects.filter(user=user).annotate(key=normalized_name()).values('key').annotate(count=Count('id')).filter(count__gt=1).values('key')
+    candidates = (
+        with_practice_stats(model.objects.filter(user=user))
+        .annotate(key=normalized_name())
+        .filter(key__in=names)
+        .order_by('key', '-session_count', 'id')
+    )
+    return [list(group) for key, group in itertools.groupby(candidates, key=lambda obj: obj.key)]
+
+
+def _merge_notes(winner, losers):
+    notes = [winner.notes] if winner.notes else []
+    for loser in losers:
+        if loser.notes and loser.notes not in notes:
+            notes.append(loser.notes)
+    return '\n\n'.join(notes) or None
+
+
+@transaction.atomic
+def merge(user, winner, losers):
+    """Moves every session and goal of `losers` to `winner` and deletes them; returns how many sessions moved.
+
+    One UPDATE repoints the sessions, whatever their number. A goal on a duplicate is kept only when the
+    winner has none for that period yet.
+    """
+    model = type(winner)
+    field = model._meta.model_name
+    losers = list(model.objects.filter(user=user, pk__in=[loser.pk for loser in losers]).exclude(pk=winner.pk))
+    if not losers:
+        return 0
+    sessions = Practice.objects.filter(user=user, **{f'{field}__in': losers})
+    keys = rollups.affected(sessions)
+    moved = sessions.update(**{field: winner}, updated_at=timezone.now())
+
+    periods = set(Goal.objects.filter(**{field: winner}).values_list('period', flat=True))
+    for goal in Goal.objects.filter(**{f'{field}__in': losers}):
+        if goal.period not in periods:
+            Goal.objects.filter(pk=goal.pk).update(**{field: winner})
+            periods.add(goal.period)
+
+    winner.notes = _merge_notes(winner, losers)
+    for name in FILL_FIELDS.get(model, ()):
+        if not getattr(winner, name):
+            setattr(winner, name, next((getattr(loser, name) for loser in losers if getattr(loser, name)), None))
+    winner.save()
+    # Cascades to the duplicates' rollup rows and leftover goals
+    model.objects.filter(pk__in=[loser.pk for loser in losers]).delete()
+    refresh_derived(user, keys | rollups.moved(keys, {field: winner}))
+    return moved
@@ -0,0 +1,108 @@
+import bisect
+import collections
+import threading
+
+from . import stats_cache
+
+# Upper bounds (seconds) of the cumulative request duration histogram
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# The rolling quantiles cover this many of each view's most recent requests
+WINDOW = 500
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+class ViewStats:
+    def __init__(self):
+        self.count = 0
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.duration = 0.0
+        self.queries = 0
+        self.sql = 0.0
+        self.template = 0.0
+        self.bytes = 0
+        self.recent = collections.deque(maxlen=WINDOW)
+
+
+_views = {}
+_lock = threading.Lock()
+
+
+def record(view, duration, queries, sql, template, size):
+    with _lock:
+        stats = _views.setdefault(view, ViewStats())
+        stats.count += 1
+        stats.buckets[bisect.bisect_left(BUCKETS, duration)] += 1
+        stats.duration += duration
+        stats.queries += queries
+        stats.sql += sql
+        stats.template += template
+        stats.bytes += size or 0
+        stats.recent.append(duration)
+
+
+def quantile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summary():
+    """Per-view totals plus quantiles of the rolling window, as plain data."""
+    with _lock:
+        views = {view: (vars(stats).copy(), sorted(stats.recent)) for view, stats in _views.items()}
+    result = {}
+    for view, (stats, recent) in views.items():
+        stats['recent'] = {fraction: quantile(recent, fraction) for fraction in QUANTILES} if recent else {}
+        result[view] = stats
+    return result
+
+
+def reset():
+    with _lock:
+        _views.clear()
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    return repr(float(value))
+
+
+def render_prometheus():
+    """The metrics in the Prometheus text exposition format."""
+    views = summary()
+    lines = [
+        '# HELP studiolog_request_duration_seconds Time spent handling requests, by view.',
+        '# TYPE studiolog_request_duration_seconds histogram',
+    ]
+    for view, stats in sorted(views.items()):
+        cumulative = 0
+        for bound, count in zip(BUCKETS + ('+Inf',), stats['buckets']):
+            cumulative += count
+            lines.append(f'studiolog_request_duration_seconds_bucket{{view="{_label(view)}",le="{bound}"}} {cumulative}')
+        lines.append(f'studiolog_request_duration_seconds_sum{{view="{_label(view)}"}} {_number(stats["duration"])}')
+        lines.append(f'studiolog_request_duration_seconds_count{{view="{_label(view)}"}} {stats["count"]}')
+
+    lines += [
+        f'# HELP studiolog_recent_request_duration_seconds Request duration quantiles over the last {WINDOW} requests, by view.',
+        '# TYPE studiolog_recent_request_duration_seconds summary',
+    ]
+    for view, stats in sorted(views.items()):
+        for fraction, value in stats['recent'].items():
+            lines.append(f'studiolog_recent_request_duration_seconds{{view="{_label(view)}",quantile="{fraction}"}} {_number(value)}')
+
+    counters = [
+        ('sql_queries', 'queries', 'SQL queries run while handling requests'),
+        ('sql_duration_seconds', 'sql', 'Time spent in SQL while handling requests'),
+        ('template_render_seconds', 'template', 'Time spent rendering templates'),
+        ('response_bytes', 'bytes', 'Bytes of (non-streaming) response bodies'),
+    ]
+    for name, key, help in counters:
+        lines += [f'# HELP studiolog_{name}_total {help}, by view.', f'# TYPE studiolog_{name}_total counter']
+        for view, stats in sorted(views.items()):
+            lines.append(f'studiolog_{name}_total{{view="{_label(view)}"}} {_number(stats[key])}')
+
+    cache = stats_cache.cache_info()
+    for name in ('hits', 'misses', 'invalidations'):
+        lines += [f'# HELP studiolog_stats_cache_{name}_total Stats cache {name} in this process.', f'# TYPE studiolog_stats_cache_{name}_total counter', f'studiolog_stats_cache_{name}_total {cache[name]}']
+    return '\n'.join(lines) + '\n'
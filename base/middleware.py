@@ -0,0 +1,68 @@
+import contextlib
+import time
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from . import metrics
+
+
+class RequestTiming:
+    def __init__(self):
+        self.queries = 0
+        self.sql = 0.0
+        self.template = 0.0
+        self.render_started = None
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper hook: times every statement the request runs
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql += time.perf_counter() - start
+            self.queries += 1
+
+    def render_finished(self, response):
+        self.template += time.perf_counter() - self.render_started
+
+
+class PerformanceMiddleware:
+    """Records duration, SQL and template time and response size per view, and reports them in Server-Timing.
+
+    Switched on by the PERFORMANCE_METRICS environment variable; otherwise Django drops it from the stack.
+    Queries run on other threads (the async views' parts) or while a streaming response is consumed are not counted.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PERFORMANCE_METRICS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timing = request._performance_timing = RequestTiming()
+        start = time.perf_counter()
+        with contextlib.ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timing))
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        view = request.resolver_match.view_name if request.resolver_match else 'unresolved'
+        size = None if response.streaming else len(response.content)
+        metrics.record(view, duration, timing.queries, timing.sql, timing.template, size)
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={timing.sql * 1000:.1f};desc="{timing.queries} queries"',
+            f'tpl;dur={timing.template * 1000:.1f}',
+            f'total;dur={duration * 1000:.1f}',
+        ])
+        return response
+
+    def process_template_response(self, request, response):
+        # Called just before a TemplateResponse renders; the post-render callback closes the interval
+        timing = getattr(request, '_performance_timing', None)
+        if timing is not None:
+            timing.render_started = time.perf_counter()
+            response.add_post_render_callback(timing.render_finished)
+        return response
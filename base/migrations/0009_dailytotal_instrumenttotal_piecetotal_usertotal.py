@@ -0,0 +1,89 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:17
+
+import datetime
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Max, Sum
+
+
+def build_rollups(apps, schema_editor):
+    Practice = apps.get_model('base', 'Practice')
+    UserTotal = apps.get_model('base', 'UserTotal')
+    groups = (
+        (apps.get_model('base', 'InstrumentTotal'), 'instrument_id'),
+        (apps.get_model('base', 'PieceTotal'), 'piece_id'),
+        (apps.get_model('base', 'DailyTotal'), 'date'),
+    )
+    sessions = Practice.objects.exclude(user=None).order_by()
+    UserTotal.objects.bulk_create([
+        UserTotal(user_id=row['user_id'], total_duration=row['total'], session_count=row['count'], longest_session=row['longest'])
+        for row in sessions.values('user_id').annotate(total=Sum('duration'), count=Count('id'), longest=Max('duration'))
+    ])
+    for model, field in groups:
+        model.objects.bulk_create([
+            model(user_id=row['user_id'], total_duration=row['total'], session_count=row['count'], **{field: row[field]})
+            for row in sessions.exclude(**{field: None}).values('user_id', field).annotate(total=Sum('duration'), count=Count('id'))
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('base', '0008_auto_20210622_1012'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_duration', models.DurationField(default=datetime.timedelta)),
+                ('session_count', models.PositiveIntegerField(default=0)),
+                ('longest_session', models.DurationField(blank=True, null=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='practice_total', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PieceTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_duration', models.DurationField(default=datetime.timedelta)),
+                ('session_count', models.PositiveIntegerField(default=0)),
+                ('piece', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='totals', to='base.piece')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'piece')},
+            },
+        ),
+        migrations.CreateModel(
+            name='InstrumentTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_duration', models.DurationField(default=datetime.timedelta)),
+                ('session_count', models.PositiveIntegerField(default=0)),
+                ('instrument', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='totals', to='base.instrument')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'instrument')},
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('total_duration', models.DurationField(default=datetime.timedelta)),
+                ('session_count', models.PositiveIntegerField(default=0)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['date'],
+                'unique_together': {('user', 'date')},
+            },
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:18
+
+import datetime
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def build_streaks(apps, schema_editor):
+    DailyTotal = apps.get_model('base', 'DailyTotal')
+    Streak = apps.get_model('base', 'Streak')
+    UserTotal = apps.get_model('base', 'UserTotal')
+    one_day = datetime.timedelta(days=1)
+    runs = {}
+    for user_id, day in DailyTotal.objects.order_by('user_id', 'date').values_list('user_id', 'date'):
+        user_runs = runs.setdefault(user_id, [])
+        if user_runs and user_runs[-1][1] == day - one_day:
+            user_runs[-1][1] = day
+        else:
+            user_runs.append([day, day])
+    for user_id, user_runs in runs.items():
+        Streak.objects.bulk_create([Streak(user_id=user_id, start=start, end=end, length=(end - start).days + 1) for start, end in user_runs])
+        UserTotal.objects.filter(user_id=user_id).update(
+            longest_streak=max((end - start).days + 1 for start, end in user_runs),
+            last_practiced=user_runs[-1][1],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('base', '0009_dailytotal_instrumenttotal_piecetotal_usertotal'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='usertotal',
+            name='last_practiced',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='usertotal',
+            name='longest_streak',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='Streak',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start', models.DateField()),
+                ('end', models.DateField()),
+                ('length', models.PositiveIntegerField(default=1)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='streaks', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-end'],
+                'unique_together': {('user', 'start'), ('user', 'end')},
+            },
+        ),
+        migrations.RunPython(build_streaks, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0010_auto_20261018_1318'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='practice',
+            index=models.Index(fields=['user', 'date', 'id'], name='practice_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='practice',
+            index=models.Index(fields=['user', 'instrument', 'date'], name='practice_user_instrument_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='practice',
+            index=models.Index(fields=['user', 'piece', 'date'], name='practice_user_piece_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='practice',
+            index=models.Index(fields=['user', 'duration'], name='practice_user_duration_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+def install_search(apps, schema_editor):
+    from base import search
+    search.install(schema_editor.connection)
+
+
+def uninstall_search(apps, schema_editor):
+    from base import search
+    search.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0011_auto_20261018_1318'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search, uninstall_search),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:58
+
+import datetime
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth, TruncWeek
+
+
+def build_period_totals(apps, schema_editor):
+    Practice = apps.get_model('base', 'Practice')
+    PeriodTotal = apps.get_model('base', 'PeriodTotal')
+    for subject in ('instrument_id', 'piece_id'):
+        for period, trunc in (('week', TruncWeek), ('month', TruncMonth)):
+            rows = (
+                Practice.objects.exclude(user=None).exclude(**{subject: None}).order_by()
+                .annotate(start=trunc('date')).values('user_id', subject, 'start')
+                .annotate(total_duration=Sum('duration'), session_count=Count('id'))
+            )
+            PeriodTotal.objects.bulk_create([
+                PeriodTotal(
+                    user_id=row['user_id'], period=period,
+                    start=row['start'].date() if isinstance(row['start'], datetime.datetime) else row['start'],
+                    total_duration=row['total_duration'], session_count=row['session_count'], **{subject: row[subject]},
+                )
+                for row in rows.iterator()
+            ], batch_size=2000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('base', '0014_data_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PeriodTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(max_length=5)),
+                ('start', models.DateField()),
+                ('total_duration', models.DurationField(default=datetime.timedelta)),
+                ('session_count', models.PositiveIntegerField(default=0)),
+                ('instrument', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='period_totals', to='base.instrument')),
+                ('piece', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='period_totals', to='base.piece')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Goal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.CharField(choices=[('week', 'Weekly'), ('month', 'Monthly')], default='week', max_length=5)),
+                ('target', models.DurationField()),
+                ('instrument', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='goals', to='base.instrument')),
+                ('piece', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='goals', to='base.piece')),
+                ('user', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='goals', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['period', 'id'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='periodtotal',
+            constraint=models.UniqueConstraint(condition=models.Q(('instrument__isnull', False)), fields=('user', 'instrument', 'period', 'start'), name='period_total_instrument_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='periodtotal',
+            constraint=models.UniqueConstraint(condition=models.Q(('piece__isnull', False)), fields=('user', 'piece', 'period', 'start'), name='period_total_piece_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='goal',
+            constraint=models.CheckConstraint(check=models.Q(models.Q(('instrument__isnull', False), ('piece__isnull', True)), models.Q(('instrument__isnull', True), ('piece__isnull', False)), _connector='OR'), name='goal_has_one_subject'),
+        ),
+        migrations.RunPython(build_period_totals, migrations.RunPython.noop),
+    ]
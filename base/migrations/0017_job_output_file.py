@@ -0,0 +1,23 @@
+# Generated by Django 3.2.25 on 2026-10-18 14:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0016_jobs'),
+    ]
+
+    # Stored exports move from the row to the file storage; a bytea column can't be cast to a path
+    operations = [
+        migrations.RemoveField(
+            model_name='job',
+            name='output',
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='output',
+            field=models.FileField(blank=True, null=True, upload_to='jobs/'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations
+
+
+def reinstall_search(config):
+    def reinstall(apps, schema_editor):
+        # Only the Postgres index depends on the text search configuration
+        from base import search
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        backend = search.PostgresSearch()
+        backend.config = config
+        with schema_editor.connection.cursor() as cursor:
+            backend.uninstall(cursor)
+            backend.install(cursor)
+    return reinstall
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0017_job_output_file'),
+    ]
+
+    # The generated search_vector column can't be altered in place, so it is dropped and added again
+    operations = [
+        migrations.RunPython(reinstall_search('simple'), reinstall_search('english')),
+    ]
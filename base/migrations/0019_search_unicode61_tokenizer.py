@@ -0,0 +1,27 @@
+from django.db import migrations
+
+
+def reinstall_search(tokenizer):
+    def reinstall(apps, schema_editor):
+        # Only the SQLite index depends on the tokenizer
+        from base import search
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        backend = search.SqliteSearch()
+        backend.tokenizer = tokenizer
+        with schema_editor.connection.cursor() as cursor:
+            backend.uninstall(cursor)
+            backend.install(cursor)
+    return reinstall
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0018_search_simple_config'),
+    ]
+
+    # An FTS5 table's tokenizer is fixed when it is created, so the tables and their triggers are built again
+    operations = [
+        migrations.RunPython(reinstall_search('unicode61'), reinstall_search('porter unicode61')),
+    ]
@@ -1,4 +1,7 @@
+import datetime
+
 from django.db import models
+from django.utils import timezone
 from django.urls import path, include
 from django.contrib.auth.models import User
 
@@ -7,6 +10,7 @@ class Instrument(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True)
     name = models.CharField(max_length=100)
     notes = models.TextField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
@@ -17,6 +21,7 @@ class Piece(models.Model):
     artist = models.CharField(max_length=100, null=True, blank=True)
     album = models.CharField(max_length=100, null=True, blank=True)
     notes = models.TextField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
@@ -28,15 +33,191 @@ class Practice(models.Model):
     instrument = models.ForeignKey(Instrument, on_delete=models.SET_NULL,null=True, blank=True, related_name='sessions')
     piece = models.ForeignKey(Piece, on_delete=models.SET_NULL, null=True, blank=True, related_name='sessions')
     notes = models.TextField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.date} for {self.duration}"
 
     class Meta:
         ordering = ['date']
-   
+        # Every page scopes sessions to one user, then orders or ranges on date/duration
+        indexes = [
+            models.Index(fields=['user', 'date', 'id'], name='practice_user_date_idx'),
+            models.Index(fields=['user', 'instrument', 'date'], name='practice_user_instrument_idx'),
+            models.Index(fields=['user', 'piece', 'date'], name='practice_user_piece_idx'),
+            models.Index(fields=['user', 'duration'], name='practice_user_duration_idx'),
+        ]
+
+class UserTotal(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='practice_total')
+    total_duration = models.DurationField(default=datetime.timedelta)
+    session_count = models.PositiveIntegerField(default=0)
+    longest_session = models.DurationField(null=True, blank=True)
+    longest_streak = models.PositiveIntegerField(default=0)
+    last_practiced = models.DateField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.user} for {self.total_duration}"
+
+    @property
+    def avg_duration(self):
+        if not self.session_count:
+            return None
+        return self.total_duration / self.session_count
+
+class DataVersion(models.Model):
+    # Bumped by every write to the user's sessions, instruments or pieces; pages use it to answer conditional GETs
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='data_version')
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.user} at {self.version}"
+
+class InstrumentTotal(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    instrument = models.ForeignKey(Instrument, on_delete=models.CASCADE, related_name='totals')
+    total_duration = models.DurationField(default=datetime.timedelta)
+    session_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.instrument} for {self.total_duration}"
+
+    @property
+    def avg_duration(self):
+        if not self.session_count:
+            return None
+        return self.total_duration / self.session_count
 
+    class Meta:
+        unique_together = ['user', 'instrument']
+
+class PieceTotal(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    piece = models.ForeignKey(Piece, on_delete=models.CASCADE, related_name='totals')
+    total_duration = models.DurationField(default=datetime.timedelta)
+    session_count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.piece} for {self.total_duration}"
+
+    @property
+    def avg_duration(self):
+        if not self.session_count:
+            return None
+        return self.total_duration / self.session_count
+
+    class Meta:
+        unique_together = ['user', 'piece']
+
+class DailyTotal(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    date = models.DateField()
+    total_duration = models.DurationField(default=datetime.timedelta)
+    session_count = models.PositiveIntegerField(default=0)
 
+    def __str__(self):
+        return f"{self.date} for {self.total_duration}"
 
+    class Meta:
+        unique_together = ['user', 'date']
+        ordering = ['date']
 
+class PeriodTotal(models.Model):
+    # Practice time per instrument, or per piece, in each week and month; what goal progress is read from
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    instrument = models.ForeignKey(Instrument, on_delete=models.CASCADE, null=True, related_name='period_totals')
+    piece = models.ForeignKey(Piece, on_delete=models.CASCADE, null=True, related_name='period_totals')
+    period = models.CharField(max_length=5)
+    start = models.DateField()
+    total_duration = models.DurationField(default=datetime.timedelta)
+    session_count = models.PositiveIntegerField(default=0)
 
+    def __str__(self):
+        return f"{self.instrument or self.piece} from {self.start} for {self.total_duration}"
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'instrument', 'period', 'start'], condition=models.Q(instrument__isnull=False), name='period_total_instrument_unique'),
+            models.UniqueConstraint(fields=['user', 'piece', 'period', 'start'], condition=models.Q(piece__isnull=False), name='period_total_piece_unique'),
+        ]
+
+class Goal(models.Model):
+    PERIODS = [('week', 'Weekly'), ('month', 'Monthly')]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, related_name='goals')
+    instrument = models.ForeignKey(Instrument, on_delete=models.CASCADE, null=True, blank=True, related_name='goals')
+    piece = models.ForeignKey(Piece, on_delete=models.CASCADE, null=True, blank=True, related_name='goals')
+    period = models.CharField(max_length=5, choices=PERIODS, default='week')
+    target = models.DurationField()
+
+    def __str__(self):
+        return f"{self.get_period_display()} {self.target} on {self.instrument or self.piece}"
+
+    @property
+    def subject(self):
+        return self.instrument or self.piece
+
+    class Meta:
+        ordering = ['period', 'id']
+        constraints = [
+            models.CheckConstraint(
+                check=models.Q(instrument__isnull=False, piece__isnull=True) | models.Q(instrument__isnull=True, piece__isnull=False),
+                name='goal_has_one_subject',
+            ),
+        ]
+
+class Streak(models.Model):
+    # A run of consecutive days with at least one session
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='streaks')
+    start = models.DateField()
+    end = models.DateField()
+    length = models.PositiveIntegerField(default=1)
+
+    def __str__(self):
+        return f"{self.start} to {self.end}"
+
+    def save(self, *args, **kwargs):
+        self.length = (self.end - self.start).days + 1
+        super().save(*args, **kwargs)
+
+    class Meta:
+        ordering = ['-end']
+        unique_together = [['user', 'start'], ['user', 'end']]
+
+class Job(models.Model):
+    # A unit of background work, claimed and run by `manage.py run_workers`
+    STATUSES = [('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='jobs')
+    kind = models.CharField(max_length=50)
+    params = models.JSONField(default=dict, blank=True)
+    payload = models.BinaryField(null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUSES, default='queued')
+    progress = models.FloatField(default=0)
+    message = models.CharField(max_length=200, blank=True, default='')
+    result = models.JSONField(null=True, blank=True)
+    # Written through the default storage in chunks; on several hosts that storage has to be shared
+    output = models.FileField(upload_to='jobs/', null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    worker = models.CharField(max_length=100, blank=True, default='')
+    heartbeat = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.kind} for {self.user} ({self.status})"
+
+    @property
+    def percent(self):
+        return int(self.progress * 100)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'run_after'], name='job_status_run_after_idx'),
+            models.Index(fields=['user', 'status'], name='job_user_status_idx'),
+        ]
@@ -0,0 +1,70 @@
+import datetime
+
+from django.db.models import Q
+from django.http import Http404
+
+
+def encode_cursor(session):
+    return f"{session.date.isoformat()}_{session.id}"
+
+
+# Largest value of the bigint id; anything beyond it would overflow in the database rather than match nothing
+MAX_PK = 2 ** 63 - 1
+
+
+def decode_cursor(cursor):
+    try:
+        date, pk = cursor.split('_')
+        date, pk = datetime.date.fromisoformat(date), int(pk)
+    except ValueError:
+        raise Http404("Invalid page cursor")
+    if not 0 <= pk <= MAX_PK:
+        raise Http404("Invalid page cursor")
+    return date, pk
+
+
+class KeysetPage:
+    def __init__(self, object_list, has_next, has_previous):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def next_cursor(self):
+        if not self.has_next or not self.object_list:
+            return None
+        return encode_cursor(self.object_list[-1])
+
+    @property
+    def previous_cursor(self):
+        # None on an emptied out page too, which links back to the first page
+        if not self.has_previous or not self.object_list:
+            return None
+        return encode_cursor(self.object_list[0])
+
+
+class KeysetPaginator:
+    # Pages newest-first over (date, id); each page is an index range scan, however deep it is
+    def __init__(self, queryset, per_page):
+        self.queryset = queryset
+        self.per_page = per_page
+
+    def page(self, after=None, before=None):
+        if before:
+            date, pk = decode_cursor(before)
+            rows = list(self.queryset.filter(Q(date__gt=date) | Q(date=date, id__gt=pk)).order_by('date', 'id')[:self.per_page + 1])
+            has_previous = len(rows) > self.per_page
+            return KeysetPage(rows[:self.per_page][::-1], has_next=True, has_previous=has_previous)
+
+        queryset = self.queryset.order_by('-date', '-id')
+        if after:
+            date, pk = decode_cursor(after)
+            queryset = queryset.filter(Q(date__lt=date) | Q(date=date, id__lt=pk))
+        rows = list(queryset[:self.per_page + 1])
+        return KeysetPage(rows[:self.per_page], has_next=len(rows) > self.per_page, has_previous=bool(after))
@@ -0,0 +1,294 @@
+import contextlib
+import datetime
+import functools
+import threading
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Q, Sum
+
+from . import streaks
+from .analytics import GRANULARITIES, _as_date, bucket_start, next_bucket
+from .models import DailyTotal, InstrumentTotal, PeriodTotal, PieceTotal, Practice, UserTotal
+
+# Fields of a Practice row that feed into the rollup tables
+ROLLUP_FIELDS = ('user_id', 'date', 'duration', 'instrument_id', 'piece_id')
+
+# (rollup model, lookup field on the rollup, attribute on a Practice snapshot)
+GROUP_ROLLUPS = (
+    (InstrumentTotal, 'instrument_id', 'instrument_id'),
+    (PieceTotal, 'piece_id', 'piece_id'),
+    (DailyTotal, 'date', 'date'),
+)
+
+# PeriodTotal keeps a row per (subject, period, start) for both kinds of subject
+PERIOD_SUBJECTS = ('instrument_id', 'piece_id')
+PERIODS = ('week', 'month')
+
+_deferred = threading.local()
+
+
+def snapshot(practice):
+    return {field: getattr(practice, field) for field in ROLLUP_FIELDS}
+
+
+def _increment(model, lookup, duration, sign):
+    return model.objects.filter(**lookup).update(
+        total_duration=F('total_duration') + duration * sign,
+        session_count=F('session_count') + sign,
+    )
+
+
+def _add_to_group(model, lookup, duration, sign):
+    # Returns True when the group gained its first session or lost its last one
+    if sign < 0:
+        _increment(model, lookup, duration, sign)
+        deleted, _ = model.objects.filter(session_count=0, **lookup).delete()
+        return bool(deleted)
+    if _increment(model, lookup, duration, sign):
+        return False
+    try:
+        with transaction.atomic():
+            model.objects.create(total_duration=duration, session_count=1, **lookup)
+        return True
+    except IntegrityError:
+        # A concurrent first session created the row after the update found none; add to that one
+        _increment(model, lookup, duration, sign)
+        return False
+
+
+def _add_to_user(values, sign):
+    user_id, duration = values['user_id'], values['duration']
+    if sign > 0:
+        # get_or_create falls back to reading the row when a concurrent first session created it
+        total, created = UserTotal.objects.get_or_create(user_id=user_id, defaults={'total_duration': duration, 'session_count': 1, 'longest_session': duration})
+        if created:
+            return
+        UserTotal.objects.filter(user_id=user_id).update(total_duration=F('total_duration') + duration, session_count=F('session_count') + 1)
+        UserTotal.objects.filter(Q(longest_session__isnull=True) | Q(longest_session__lt=duration), user_id=user_id).update(longest_session=duration)
+        return
+
+    _remove_from_user(user_id, duration, 1, duration)
+
+
+def _remove_from_user(user_id, duration, count, longest):
+    UserTotal.objects.filter(user_id=user_id).update(total_duration=F('total_duration') - duration, session_count=F('session_count') - count)
+    # Only a removed longest session forces a rescan, and that rescan is a single indexed Max
+    if UserTotal.objects.filter(user_id=user_id, longest_session__lte=longest).exists():
+        longest = Practice.objects.filter(user_id=user_id).aggregate(Max('duration')).get('duration__max')
+        UserTotal.objects.filter(user_id=user_id).update(longest_session=longest)
+
+
+def period_lookups(values):
+    # The PeriodTotal rows one session counts towards: its instrument's and its piece's week and month
+    for subject in PERIOD_SUBJECTS:
+        if values[subject] is not None:
+            for period in PERIODS:
+                yield {'user_id': values['user_id'], subject: values[subject], 'period': period, 'start': bucket_start(values['date'], period)}
+
+
+def apply(values, sign):
+    # Adds (sign=1) or removes (sign=-1) one session snapshot from every rollup it belongs to
+    if values is None or values['user_id'] is None:
+        return
+    with transaction.atomic():
+        _add_to_user(values, sign)
+        for model, lookup_field, attr in GROUP_ROLLUPS:
+            if values[attr] is None:
+                continue
+            changed = _add_to_group(model, {'user_id': values['user_id'], lookup_field: values[attr]}, values['duration'], sign)
+            if model is DailyTotal and changed:
+                if sign > 0:
+                    streaks.add_day(values['user_id'], values['date'])
+                else:
+                    streaks.remove_day(values['user_id'], values['date'])
+        for lookup in period_lookups(values):
+            _add_to_group(PeriodTotal, lookup, values['duration'], sign)
+
+
+def replace(old, new):
+    if old == new:
+        return
+    with transaction.atomic():
+        apply(old, -1)
+        apply(new, 1)
+
+
+@contextlib.contextmanager
+def deferred():
+    """Turns the per-session rollup updates of the Practice signals off for a batch write on this thread.
+
+    The batch then calls refresh() once with the keys it touched.
+    """
+    previous = getattr(_deferred, 'active', False)
+    _deferred.active = True
+    try:
+        yield
+    finally:
+        _deferred.active = previous
+
+
+def is_deferred():
+    return getattr(_deferred, 'active', False)
+
+
+def affected(sessions):
+    # The (instrument_id, piece_id, date) groups the sessions count towards
+    return set(sessions.order_by().values_list('instrument_id', 'piece_id', 'date').distinct())
+
+
+def moved(keys, fields=None, days=0):
+    # The groups the same sessions count towards once `fields` (instrument=..., piece=...) are set and the dates shifted
+    fields = {name: getattr(value, 'pk', value) for name, value in (fields or {}).items()}
+    return {
+        (fields.get('instrument', instrument_id), fields.get('piece', piece_id), date + datetime.timedelta(days=days))
+        for instrument_id, piece_id, date in keys
+    }
+
+
+def _recompute(user, model, lookup_field, attr, sessions, scope):
+    # Replaces the stored rows in scope with fresh aggregates; returns the keys that had a row before and after
+    stored = model.objects.filter(user=user, **scope)
+    before = set(stored.values_list(lookup_field, flat=True))
+    live = list(sessions.filter(**scope).exclude(**{attr: None}).values(attr).annotate(total_duration=Sum('duration'), session_count=Count('id')))
+    stored.delete()
+    model.objects.bulk_create([
+        model(user=user, total_duration=row['total_duration'], session_count=row['session_count'], **{lookup_field: row[attr]})
+        for row in live
+    ])
+    return before, {row[attr] for row in live}
+
+
+def _recompute_periods(user, sessions, subject, period, ids=None, start=None, end=None):
+    # Replaces the subject's PeriodTotal rows for the period, optionally only those of `ids` starting in [start, end)
+    sessions = sessions.exclude(**{subject: None})
+    stored = PeriodTotal.objects.filter(user=user, period=period).exclude(**{subject: None})
+    if ids is not None:
+        sessions, stored = sessions.filter(**{f'{subject}__in': ids}), stored.filter(**{f'{subject}__in': ids})
+    if start is not None:
+        sessions, stored = sessions.filter(date__gte=start, date__lt=end), stored.filter(start__gte=start, start__lt=end)
+    rows = list(sessions.annotate(start=GRANULARITIES[period]('date')).values(subject, 'start').annotate(total_duration=Sum('duration'), session_count=Count('id')))
+    stored.delete()
+    PeriodTotal.objects.bulk_create([
+        PeriodTotal(user=user, period=period, start=_as_date(row['start']), total_duration=row['total_duration'], session_count=row['session_count'], **{subject: row[subject]})
+        for row in rows
+    ])
+
+
+@transaction.atomic
+def refresh(user, keys, removed=None):
+    """Recomputes the rollup rows of the given (instrument_id, piece_id, date) groups after a batch write.
+
+    Only the sessions of the touched instruments and pieces and of the touched date range are read, not the
+    user's whole history. The user total only changes by the deleted sessions, passed as `removed`: their
+    total_duration, session_count and longest_session.
+    """
+    if not keys:
+        return
+    if removed and removed['session_count']:
+        _remove_from_user(user.pk, removed['total_duration'], removed['session_count'], removed['longest_session'])
+    sessions = Practice.objects.filter(user=user).order_by()
+    ids = {
+        'instrument_id': {instrument_id for instrument_id, piece_id, date in keys if instrument_id is not None},
+        'piece_id': {piece_id for instrument_id, piece_id, date in keys if piece_id is not None},
+    }
+    first, last = min(date for _, _, date in keys), max(date for _, _, date in keys)
+
+    for model, lookup_field, attr in GROUP_ROLLUPS:
+        if model is DailyTotal:
+            before, after = _recompute(user, model, lookup_field, attr, sessions, {'date__range': (first, last)})
+            for day in sorted(before - after):
+                streaks.remove_day(user.pk, day)
+            for day in sorted(after - before):
+                streaks.add_day(user.pk, day)
+        elif ids[attr]:
+            _recompute(user, model, lookup_field, attr, sessions, {f'{attr}__in': ids[attr]})
+
+    for subject in PERIOD_SUBJECTS:
+        if not ids[subject]:
+            continue
+        for period in PERIODS:
+            end = next_bucket(bucket_start(last, period), period)
+            _recompute_periods(user, sessions, subject, period, ids=ids[subject], start=bucket_start(first, period), end=end)
+
+
+def totals_for(model, **lookup):
+    # Stored rollup row, or an empty unsaved one when nothing has been logged yet
+    return model.objects.filter(**lookup).first() or model(**lookup)
+
+
+def live_totals(user):
+    # The rollup contents computed from scratch out of the Practice table
+    sessions = Practice.objects.filter(user=user).order_by()
+    user_total = sessions.aggregate(total_duration=Sum('duration'), session_count=Count('id'), longest_session=Max('duration'))
+    if user_total['total_duration'] is None:
+        user_total['total_duration'] = datetime.timedelta(0)
+    groups = {}
+    for model, lookup_field, attr in GROUP_ROLLUPS:
+        rows = sessions.exclude(**{attr: None}).values(attr).annotate(total_duration=Sum('duration'), session_count=Count('id'))
+        groups[model] = {row[attr]: (row['total_duration'], row['session_count']) for row in rows}
+    groups[PeriodTotal] = {}
+    for subject in PERIOD_SUBJECTS:
+        for period in PERIODS:
+            rows = sessions.exclude(**{subject: None}).annotate(start=GRANULARITIES[period]('date')).values(subject, 'start').annotate(total_duration=Sum('duration'), session_count=Count('id'))
+            groups[PeriodTotal].update({(subject, row[subject], period, _as_date(row['start'])): (row['total_duration'], row['session_count']) for row in rows})
+    return user_total, groups
+
+
+def stored_totals(user):
+    user_total = UserTotal.objects.filter(user=user).values('total_duration', 'session_count', 'longest_session').first()
+    if user_total is None:
+        user_total = {'total_duration': datetime.timedelta(0), 'session_count': 0, 'longest_session': None}
+    groups = {}
+    for model, lookup_field, attr in GROUP_ROLLUPS:
+        rows = model.objects.filter(user=user).values(lookup_field, 'total_duration', 'session_count')
+        groups[model] = {row[lookup_field]: (row['total_duration'], row['session_count']) for row in rows}
+    groups[PeriodTotal] = {}
+    for row in PeriodTotal.objects.filter(user=user).values(*PERIOD_SUBJECTS, 'period', 'start', 'total_duration', 'session_count'):
+        subject = 'instrument_id' if row['instrument_id'] is not None else 'piece_id'
+        groups[PeriodTotal][(subject, row[subject], row['period'], row['start'])] = (row['total_duration'], row['session_count'])
+    return user_total, groups
+
+
+def _rebuild_user_total(user):
+    user_total = Practice.objects.filter(user=user).aggregate(total_duration=Sum('duration'), session_count=Count('id'), longest_session=Max('duration'))
+    if user_total['total_duration'] is None:
+        user_total['total_duration'] = datetime.timedelta(0)
+    UserTotal.objects.update_or_create(user=user, defaults=user_total)
+
+
+def rebuild(user, report=None):
+    """Recomputes every rollup row of the user from the Practice table.
+
+    This is one transaction, unless a background job passes its report(fraction, message): then each table
+    is rebuilt in a transaction of its own and reported in between, which keeps the job's heartbeat going.
+    """
+    sessions = Practice.objects.filter(user=user).order_by()
+    steps = [functools.partial(_rebuild_user_total, user)]
+    steps += [functools.partial(_recompute, user, model, lookup_field, attr, sessions, {}) for model, lookup_field, attr in GROUP_ROLLUPS]
+    steps += [functools.partial(_recompute_periods, user, sessions, subject, period) for subject in PERIOD_SUBJECTS for period in PERIODS]
+    steps.append(functools.partial(streaks.rebuild, user))
+    if report is None:
+        with transaction.atomic():
+            for step in steps:
+                step()
+        return
+    for number, step in enumerate(steps):
+        report(number / len(steps), 'Rebuilding totals')
+        with transaction.atomic():
+            step()
+
+
+def verify(user):
+    # Returns a list of human readable mismatches between the stored rollups and the live aggregates
+    live_user, live_groups = live_totals(user)
+    stored_user, stored_groups = stored_totals(user)
+    problems = []
+    for field, value in live_user.items():
+        if stored_user[field] != value:
+            problems.append(f"{user}: {field} is {stored_user[field]}, expected {value}")
+    for model in live_groups:
+        live, stored = live_groups[model], stored_groups[model]
+        for key in live.keys() | stored.keys():
+            if live.get(key) != stored.get(key):
+                problems.append(f"{user}: {model.__name__} {key} is {stored.get(key)}, expected {live.get(key)}")
+    return problems + streaks.verify(user)
@@ -0,0 +1,211 @@
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Instrument, Piece, Practice
+
+# Searchable text of each model, most important field first
+DOCUMENTS = {
+    'instrument': (Instrument, ('name', 'notes')),
+    'piece': (Piece, ('name', 'artist', 'album', 'notes')),
+    'session': (Practice, ('notes',)),
+}
+FIELDS = {model: fields for model, fields in DOCUMENTS.values()}
+MAX_TERMS = 8
+
+
+def terms(query):
+    # Words only, so nothing the user types can change the meaning of the match expression
+    return re.findall(r'\w+', (query or '').lower())[:MAX_TERMS]
+
+
+class PostgresSearch:
+    """A generated tsvector column per table with a GIN index on it.
+
+    Postgres keeps the column in step with every INSERT and UPDATE, bulk ones included. Each field gets its
+    own weight label, which both ranks name matches higher and lets a filter restrict the match to one field.
+    """
+    # Indexed as typed, like SqliteSearch: 'english' drops stopwords such as "the" (a query of them matches nothing)
+    config = 'simple'
+    weights = 'ABCD'
+
+    def document(self, fields):
+        return ' || '.join(
+            f"setweight(to_tsvector('{self.config}'::regconfig, coalesce({field}, '')), '{weight}')"
+            for field, weight in zip(fields, self.weights)
+        )
+
+    def install(self, cursor):
+        for model, fields in FIELDS.items():
+            table = model._meta.db_table
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ({self.document(fields)}) STORED")
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS {table}_search_idx ON {table} USING gin (search_vector)")
+
+    def repair(self, cursor):
+        # Generated columns survive ALTER TABLE, so there is nothing to restore
+        pass
+
+    def uninstall(self, cursor):
+        for model in FIELDS:
+            cursor.execute(f"ALTER TABLE {model._meta.db_table} DROP COLUMN IF EXISTS search_vector")
+
+    def tsquery(self, model, fields, words):
+        labels = ''.join(self.weights[FIELDS[model].index(field)] for field in fields)
+        return ' & '.join(f"{word}:*{labels}" for word in words)
+
+    def filter(self, queryset, fields, words):
+        table = queryset.model._meta.db_table
+        return queryset.extra(where=[f"{table}.search_vector @@ to_tsquery(%s::regconfig, %s)"], params=[self.config, self.tsquery(queryset.model, fields, words)])
+
+    def ranked(self, model, user_id, words, limit):
+        table = model._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT id, ts_rank(search_vector, query) FROM {table}, to_tsquery(%s::regconfig, %s) query "
+                f"WHERE user_id = %s AND search_vector @@ query ORDER BY 2 DESC LIMIT %s",
+                [self.config, self.tsquery(model, (), words), user_id, limit],
+            )
+            return cursor.fetchall()
+
+
+class SqliteSearch:
+    """An external-content FTS5 table per model, kept in sync by triggers on the model table.
+
+    The triggers belong to the model table, so they are lost whenever a migration rebuilds it; repair() runs
+    after every migrate to put them back.
+    """
+    # bm25() column weights, in DOCUMENTS field order
+    weights = (10.0, 4.0, 2.0, 1.0)
+    # Not 'porter': words are matched as prefixes, and a stemmed index misses part of a word ("runn" of "running")
+    tokenizer = 'unicode61'
+
+    def install(self, cursor):
+        for model, fields in FIELDS.items():
+            table = model._meta.db_table
+            index = f"{table}_fts"
+            cursor.execute(f"CREATE VIRTUAL TABLE {index} USING fts5({', '.join(fields)}, content='{table}', content_rowid='id', tokenize='{self.tokenizer}')")
+            cursor.execute(f"INSERT INTO {index}({index}) VALUES ('rebuild')")
+        self.repair(cursor)
+
+    def repair(self, cursor):
+        for model, fields in FIELDS.items():
+            table = model._meta.db_table
+            index = f"{table}_fts"
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [index])
+            if cursor.fetchone() is None:
+                continue
+            columns = ', '.join(fields)
+            new_values = ', '.join(f"new.{field}" for field in fields)
+            old_values = ', '.join(f"old.{field}" for field in fields)
+            cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {index}_insert AFTER INSERT ON {table} BEGIN INSERT INTO {index}(rowid, {columns}) VALUES (new.id, {new_values}); END")
+            cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {index}_delete AFTER DELETE ON {table} BEGIN INSERT INTO {index}({index}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); END")
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {index}_update AFTER UPDATE OF {columns} ON {table} BEGIN "
+                f"INSERT INTO {index}({index}, rowid, {columns}) VALUES ('delete', old.id, {old_values}); "
+                f"INSERT INTO {index}(rowid, {columns}) VALUES (new.id, {new_values}); END"
+            )
+
+    def uninstall(self, cursor):
+        for model in FIELDS:
+            index = f"{model._meta.db_table}_fts"
+            for trigger in ('insert', 'delete', 'update'):
+                cursor.execute(f"DROP TRIGGER IF EXISTS {index}_{trigger}")
+            cursor.execute(f"DROP TABLE IF EXISTS {index}")
+
+    def match(self, fields, words):
+        columns = '{' + ' '.join(fields) + '} : ' if fields else ''
+        return ' AND '.join(f'{columns}"{word}"*' for word in words)
+
+    def filter(self, queryset, fields, words):
+        table = queryset.model._meta.db_table
+        return queryset.extra(where=[f"{table}.id IN (SELECT rowid FROM {table}_fts WHERE {table}_fts MATCH %s)"], params=[self.match(fields, words)])
+
+    def ranked(self, model, user_id, words, limit):
+        table = model._meta.db_table
+        weights = ', '.join(str(weight) for weight in self.weights[:len(FIELDS[model])])
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT {table}.id, -bm25({table}_fts, {weights}) FROM {table}_fts JOIN {table} ON {table}.id = {table}_fts.rowid "
+                f"WHERE {table}_fts MATCH %s AND {table}.user_id = %s ORDER BY 2 DESC LIMIT %s",
+                [self.match((), words), user_id, limit],
+            )
+            return cursor.fetchall()
+
+
+class LikeSearch:
+    # Other databases: the old icontains scan, every match scored the same
+    def install(self, cursor):
+        pass
+
+    def uninstall(self, cursor):
+        pass
+
+    def repair(self, cursor):
+        pass
+
+    def condition(self, fields, words):
+        condition = Q()
+        for word in words:
+            condition &= Q(*(Q(**{f'{field}__icontains': word}) for field in fields), _connector=Q.OR)
+        return condition
+
+    def filter(self, queryset, fields, words):
+        return queryset.filter(self.condition(fields or FIELDS[queryset.model], words))
+
+    def ranked(self, model, user_id, words, limit):
+        return [(pk, 0.0) for pk in model.objects.filter(self.condition(FIELDS[model], words), user_id=user_id).order_by('-pk').values_list('pk', flat=True)[:limit]]
+
+
+def get_backend(connection=connection):
+    if connection.vendor == 'postgresql':
+        return PostgresSearch()
+    if connection.vendor == 'sqlite':
+        return SqliteSearch()
+    return LikeSearch()
+
+
+def install(connection=connection):
+    with connection.cursor() as cursor:
+        get_backend(connection).install(cursor)
+
+
+def uninstall(connection=connection):
+    with connection.cursor() as cursor:
+        get_backend(connection).uninstall(cursor)
+
+
+def repair(connection=connection):
+    with connection.cursor() as cursor:
+        get_backend(connection).repair(cursor)
+
+
+def filter_queryset(queryset, query, fields=()):
+    """Narrows the queryset to rows matching every word of the query (as a prefix), in the given fields or any."""
+    words = terms(query)
+    if not words:
+        return queryset
+    return get_backend().filter(queryset, fields, words)
+
+
+class SearchResult:
+    def __init__(self, kind, obj, score):
+        self.kind = kind
+        self.object = obj
+        self.score = score
+
+
+def search(user, query, limit=50):
+    """The user's instruments, pieces and sessions matching the query, best match first."""
+    words = terms(query)
+    if not words:
+        return []
+    backend = get_backend()
+    results = []
+    for kind, (model, fields) in DOCUMENTS.items():
+        scores = dict(backend.ranked(model, user.pk, words, limit))
+        queryset = model.objects.select_related('instrument', 'piece') if model is Practice else model.objects
+        for pk, obj in queryset.in_bulk(list(scores)).items():
+            results.append(SearchResult(kind, obj, scores[pk]))
+    results.sort(key=lambda result: -result.score)
+    return results[:limit]
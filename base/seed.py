@@ -0,0 +1,87 @@
+import datetime
+import math
+import random
+
+from django.contrib.auth.models import User
+
+from . import rollups
+from .models import Instrument, Piece, Practice
+
+DISTRIBUTIONS = ('fixed', 'uniform', 'lognormal')
+NOTES = (
+    'Slow practice with the metronome', 'Worked on the left hand', 'Scales and arpeggios', 'Sight reading',
+    'Memorised the first page', 'Dynamics in the middle section', 'Run-through for the recital', 'Fingering for the fast passage',
+)
+
+
+def draw(rng, mean, distribution):
+    # A per-user amount around the mean: the same for everyone, evenly spread, or a long tail of heavy users
+    if mean <= 0:
+        return 0
+    if distribution == 'fixed':
+        return mean
+    if distribution == 'uniform':
+        return rng.randint(0, 2 * mean)
+    # sigma 1 with mu shifted by -1/2 keeps the lognormal's mean at `mean`
+    return int(rng.lognormvariate(math.log(mean) - 0.5, 1.0))
+
+
+def session_duration(rng, median_minutes):
+    # Most sessions land near the median with a tail of long ones, within the form's 23:59 limit
+    minutes = rng.lognormvariate(math.log(median_minutes), 0.6)
+    return datetime.timedelta(minutes=min(max(round(minutes), 1), 23 * 60 + 59))
+
+
+def seed_user(username, sessions=10000, instruments=5, pieces=200, days=3650, batch_size=2000, seed=None, median_minutes=45, notes_share=0.2):
+    # Bulk inserts a synthetic practice history; signals are bypassed so the rollups are rebuilt once at the end
+    rng = random.Random(seed)
+    user = User.objects.create(username=username)
+    user.set_unusable_password()
+    user.save()
+    Instrument.objects.bulk_create([Instrument(user=user, name=f"Instrument {n}") for n in range(instruments)])
+    Piece.objects.bulk_create([Piece(user=user, name=f"Piece {n}", artist=f"Artist {n % 20}") for n in range(pieces)])
+    # Re-read rather than trust bulk_create, which doesn't set primary keys on every backend
+    instrument_list = list(Instrument.objects.filter(user=user))
+    piece_list = list(Piece.objects.filter(user=user))
+    # A few favourites get most of the practice, like real repertoire
+    instrument_weights = [1 / (rank + 1) for rank in range(len(instrument_list))]
+    piece_weights = [1 / (rank + 1) for rank in range(len(piece_list))]
+
+    today = datetime.date.today()
+    batch = []
+    for n in range(sessions):
+        batch.append(Practice(
+            user=user,
+            date=today - datetime.timedelta(days=rng.randrange(days)),
+            duration=session_duration(rng, median_minutes),
+            instrument=rng.choices(instrument_list, instrument_weights)[0] if instrument_list else None,
+            piece=rng.choices(piece_list, piece_weights)[0] if piece_list and rng.random() < 0.8 else None,
+            notes=rng.choice(NOTES) if rng.random() < notes_share else None,
+        ))
+        if len(batch) >= batch_size:
+            Practice.objects.bulk_create(batch)
+            batch = []
+    Practice.objects.bulk_create(batch)
+    rollups.rebuild(user)
+    return user
+
+
+def seed_users(count, prefix='seed', sessions=1000, instruments=3, pieces=50, distribution='lognormal', days=3650, seed=None, **kwargs):
+    """Seeds `count` users whose session, instrument and piece counts are drawn around the given means.
+
+    Yields each user as it is finished, so callers can report progress on long runs.
+    """
+    if distribution not in DISTRIBUTIONS:
+        raise ValueError(f"Unknown distribution '{distribution}'")
+    rng = random.Random(seed)
+    for n in range(count):
+        yield seed_user(
+            f"{prefix}-{n}",
+            sessions=draw(rng, sessions, distribution),
+            # Everyone who practises plays something
+            instruments=max(1, draw(rng, instruments, distribution)),
+            pieces=draw(rng, pieces, distribution),
+            days=days,
+            seed=rng.randrange(2 ** 32),
+            **kwargs,
+        )
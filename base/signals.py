@@ -0,0 +1,70 @@
+from django.db import connections
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_save
+from django.contrib.auth.models import User
+from django.core.signals import request_started
+from django.dispatch import receiver
+
+from . import backends, rollups, search, stats_cache
+from .models import DataVersion, Goal, Instrument, Job, Piece, Practice
+
+
+@receiver(pre_save, sender=Practice)
+def remember_practice(sender, instance, raw=False, **kwargs):
+    # Keeps the row as it was before an edit so the rollups can move it rather than rescan
+    instance._rollup_previous = None
+    if raw or instance.pk is None:
+        return
+    instance._rollup_previous = Practice.objects.filter(pk=instance.pk).values(*rollups.ROLLUP_FIELDS).first()
+
+
+@receiver(post_save, sender=Practice)
+def practice_saved(sender, instance, created, raw=False, **kwargs):
+    if raw or rollups.is_deferred():
+        return
+    rollups.replace(getattr(instance, '_rollup_previous', None), rollups.snapshot(instance))
+
+
+@receiver(post_delete, sender=Practice)
+def practice_deleted(sender, instance, **kwargs):
+    if rollups.is_deferred():
+        return
+    rollups.apply(rollups.snapshot(instance), -1)
+
+
+@receiver(post_save, sender=Practice)
+@receiver(post_delete, sender=Practice)
+@receiver(post_save, sender=Instrument)
+@receiver(post_delete, sender=Instrument)
+@receiver(post_save, sender=Piece)
+@receiver(post_delete, sender=Piece)
+@receiver(post_save, sender=Goal)
+@receiver(post_delete, sender=Goal)
+def invalidate_stats(sender, instance, raw=False, **kwargs):
+    # A deferred batch of sessions invalidates once when it is done
+    if raw or (sender is Practice and rollups.is_deferred()):
+        return
+    stats_cache.invalidate(instance.user_id)
+
+
+@receiver(post_save, sender=User)
+def create_data_version(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        DataVersion.objects.create(user=instance)
+
+
+@receiver(post_delete, sender=Job)
+def delete_job_output(sender, instance, **kwargs):
+    if instance.output:
+        instance.output.delete(save=False)
+
+
+@receiver(post_migrate)
+def repair_search(sender, using, **kwargs):
+    # A migration that rebuilds a table on SQLite drops the search index triggers along with it
+    if sender.name == 'base':
+        search.repair(connections[using])
+
+
+@receiver(request_started)
+def check_connections(sender, **kwargs):
+    backends.close_unhealthy_connections()
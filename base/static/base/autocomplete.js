@@ -0,0 +1,55 @@
+// Typeahead for the AutocompleteSelect widget: a search box that loads the matching options into the select
+(function () {
+    function setOptions(select, results) {
+        var selected = select.options[select.selectedIndex];
+        var keep = selected && selected.value ? selected : null;
+        select.innerHTML = '';
+        select.appendChild(new Option('---------', '', false, !keep));
+        if (keep) {
+            select.appendChild(keep);
+        }
+        results.forEach(function (result) {
+            if (!keep || String(result.id) !== keep.value) {
+                select.appendChild(new Option(result.name, result.id));
+            }
+        });
+    }
+
+    function attach(select) {
+        var input = document.createElement('input');
+        var timer = null;
+        var latest = 0;
+        input.type = 'search';
+        input.placeholder = 'Type to search';
+        input.className = select.className + ' autocomplete-input';
+        input.setAttribute('aria-label', 'Search ' + (select.name || ''));
+        select.parentNode.insertBefore(input, select);
+
+        function load() {
+            var request = ++latest;
+            fetch(select.dataset.autocompleteUrl + '?q=' + encodeURIComponent(input.value), {credentials: 'same-origin'})
+                .then(function (response) { return response.json(); })
+                .then(function (data) {
+                    // Answers can arrive out of order; only the newest query's is shown
+                    if (request === latest) {
+                        setOptions(select, data.results);
+                    }
+                });
+        }
+
+        input.addEventListener('input', function () {
+            clearTimeout(timer);
+            timer = setTimeout(load, 200);
+        });
+        input.addEventListener('focus', function () {
+            if (!select.dataset.autocompleteLoaded) {
+                select.dataset.autocompleteLoaded = '1';
+                load();
+            }
+        });
+    }
+
+    document.addEventListener('DOMContentLoaded', function () {
+        document.querySelectorAll('select[data-autocomplete-url]').forEach(attach);
+    });
+})();
@@ -0,0 +1,27 @@
+import datetime
+
+from django.db.models import Avg, Count, Sum
+
+
+def with_practice_stats(queryset):
+    # Annotates every instrument/piece in the queryset with its session totals in one grouped query
+    return queryset.annotate(
+        total_duration=Sum('sessions__duration'),
+        session_count=Count('sessions'),
+        avg_duration=Avg('sessions__duration'),
+    )
+
+
+def leaderboard(queryset, limit=None):
+    # Instruments/pieces ranked by total practice time, skipping the ones that were never practiced
+    ranked = with_practice_stats(queryset).filter(session_count__gt=0).order_by('-total_duration', 'name', 'pk')
+    if limit is not None:
+        ranked = ranked[:limit]
+    return ranked
+
+
+def most_practiced(ranked):
+    # Takes the output of leaderboard() so the winner doesn't cost another query
+    for entry in ranked:
+        return entry.name, entry.total_duration
+    return "", datetime.timedelta(days=0, seconds=0)
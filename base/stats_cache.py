@@ -0,0 +1,72 @@
+import hashlib
+import threading
+
+from django.core.cache import caches
+
+from . import versions
+
+CACHE_ALIAS = 'stats'
+
+_counters = {'hits': 0, 'misses': 0, 'invalidations': 0}
+_counters_lock = threading.Lock()
+_missing = object()
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _count(name):
+    with _counters_lock:
+        _counters[name] += 1
+
+
+def generation(user_id):
+    # Every cached stat for a user lives under that user's data version, so a write orphans all of them at
+    # once without having to know their keys. The version is in the database rather than the cache, so a
+    # write seen by one worker invalidates the stats every other worker (and its local cache) holds too.
+    # The time of the last write keeps the keys apart should versions ever start over, as in a fresh database
+    version, updated_at = versions.current(user_id)
+    return f"{version}.{updated_at.timestamp()}"
+
+
+def stats_key(user_id, name, *parts):
+    # Parts can be raw filter query strings, so they are hashed into something every backend accepts
+    suffix = hashlib.md5(':'.join(str(part) for part in parts).encode()).hexdigest()
+    return f"stats:{user_id}:{generation(user_id)}:{name.replace(' ', '-')}:{suffix}"
+
+
+def get_or_compute(user_id, name, compute, *parts):
+    cache = _cache()
+    key = stats_key(user_id, name, *parts)
+    value = cache.get(key, _missing)
+    if value is not _missing:
+        _count('hits')
+        return value
+    _count('misses')
+    value = compute()
+    cache.set(key, value)
+    return value
+
+
+def invalidate(user_id):
+    # The generation is the user's data version; see versions.bump for when the change becomes visible
+    if user_id is None:
+        return
+    _count('invalidations')
+    versions.bump(user_id)
+
+
+def cache_info():
+    with _counters_lock:
+        info = dict(_counters)
+    lookups = info['hits'] + info['misses']
+    info['hit_rate'] = info['hits'] / lookups if lookups else None
+    info['backend'] = _cache().__class__.__name__
+    return info
+
+
+def reset_counters():
+    with _counters_lock:
+        for name in _counters:
+            _counters[name] = 0
@@ -0,0 +1,121 @@
+import datetime
+
+from django.db.models import Max
+
+from .models import DailyTotal, Streak, UserTotal
+
+ONE_DAY = datetime.timedelta(days=1)
+
+
+def _run_containing(user_id, day):
+    run = Streak.objects.filter(user_id=user_id, end__gte=day).order_by('end').first()
+    if run is None or run.start > day:
+        return None
+    return run
+
+
+def add_day(user_id, day):
+    # Called when a day goes from no sessions to one session; merges it into its neighbouring runs
+    before = Streak.objects.filter(user_id=user_id, end=day - ONE_DAY).first()
+    after = Streak.objects.filter(user_id=user_id, start=day + ONE_DAY).first()
+    if before and after:
+        end = after.end
+        after.delete()
+        before.end = end
+        run = before
+    elif before:
+        before.end = day
+        run = before
+    elif after:
+        after.start = day
+        run = after
+    else:
+        run = Streak(user_id=user_id, start=day, end=day)
+    run.save()
+
+    total = UserTotal.objects.filter(user_id=user_id).first()
+    if total is None:
+        return
+    total.longest_streak = max(total.longest_streak, run.length)
+    if total.last_practiced is None or day > total.last_practiced:
+        total.last_practiced = day
+    total.save(update_fields=['longest_streak', 'last_practiced'])
+
+
+def remove_day(user_id, day):
+    # Called when the last session of a day goes away; splits the run that contained it
+    run = _run_containing(user_id, day)
+    if run is None:
+        return
+    start, end = run.start, run.end
+    run.delete()
+    if start < day:
+        Streak(user_id=user_id, start=start, end=day - ONE_DAY).save()
+    if day < end:
+        Streak(user_id=user_id, start=day + ONE_DAY, end=end).save()
+
+    total = UserTotal.objects.filter(user_id=user_id).first()
+    if total is None:
+        return
+    # Only the run that held a record can lower it, so everything else skips the rescan
+    if (end - start).days + 1 >= total.longest_streak:
+        total.longest_streak = Streak.objects.filter(user_id=user_id).aggregate(Max('length')).get('length__max') or 0
+    if day == total.last_practiced:
+        total.last_practiced = Streak.objects.filter(user_id=user_id).aggregate(Max('end')).get('end__max')
+    total.save(update_fields=['longest_streak', 'last_practiced'])
+
+
+def current_streak(user, today=None):
+    # Days in a row up to and including today; like before, a day without practice yet resets it
+    today = today or datetime.date.today()
+    run = _run_containing(user.pk, today)
+    if run is None:
+        return 0
+    return (today - run.start).days + 1
+
+
+def history(user, limit=None):
+    runs = Streak.objects.filter(user=user)
+    if limit is not None:
+        runs = runs[:limit]
+    return runs
+
+
+def live_runs(user):
+    # The runs computed from scratch out of the daily rollup
+    runs = []
+    for day in DailyTotal.objects.filter(user=user).order_by('date').values_list('date', flat=True):
+        if runs and runs[-1][1] == day - ONE_DAY:
+            runs[-1][1] = day
+        else:
+            runs.append([day, day])
+    return [tuple(run) for run in runs]
+
+
+def rebuild(user):
+    runs = live_runs(user)
+    Streak.objects.filter(user=user).delete()
+    Streak.objects.bulk_create([Streak(user=user, start=start, end=end, length=(end - start).days + 1) for start, end in runs])
+    UserTotal.objects.filter(user=user).update(
+        longest_streak=max([(end - start).days + 1 for start, end in runs], default=0),
+        last_practiced=runs[-1][1] if runs else None,
+    )
+
+
+def verify(user):
+    runs = live_runs(user)
+    stored = list(Streak.objects.filter(user=user).order_by('start').values_list('start', 'end', 'length'))
+    problems = []
+    if [(start, end) for start, end, length in stored] != runs:
+        problems.append(f"{user}: streak runs are {len(stored)} stored, expected {len(runs)}")
+    for start, end, length in stored:
+        if length != (end - start).days + 1:
+            problems.append(f"{user}: streak starting {start} has length {length}, expected {(end - start).days + 1}")
+    total = UserTotal.objects.filter(user=user).values('longest_streak', 'last_practiced').first() or {'longest_streak': 0, 'last_practiced': None}
+    expected_longest = max([(end - start).days + 1 for start, end in runs], default=0)
+    expected_last = runs[-1][1] if runs else None
+    if total['longest_streak'] != expected_longest:
+        problems.append(f"{user}: longest_streak is {total['longest_streak']}, expected {expected_longest}")
+    if total['last_practiced'] != expected_last:
+        problems.append(f"{user}: last_practiced is {total['last_practiced']}, expected {expected_last}")
+    return problems
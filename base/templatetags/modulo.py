@@ -24,4 +24,13 @@ def total_time(num):
         return str((num.seconds % 3600)//60) + "m"
     return str(hours) + "h"
 
-
+@register.simple_tag(takes_context=True)
+def url_replace(context, **kwargs):
+    # Current query string (so the active filter survives) with some parameters swapped out
+    query = context['request'].GET.copy()
+    for key, value in kwargs.items():
+        if value is None:
+            query.pop(key, None)
+        else:
+            query[key] = value
+    return query.urlencode()
@@ -1,7 +1,13 @@
+from django.conf import settings
 from django.contrib.auth.views import LogoutView
 from django.urls import path
 
-from .views import CustomLoginView, InstrumentCreate, InstrumentDelete, InstrumentDetail, InstrumentList, InstrumentUpdate, PieceCreate, PieceDelete, PieceDetail, PieceList, PieceUpdate, PracticeDelete, PracticeDetail, PracticeList, PracticeCreate, PracticeUpdate, RegisterView, InfoView
+from .api import AnalyticsApi, InstrumentApiDetail, InstrumentApiList, InstrumentAutocomplete, JobApiDetail, PieceApiDetail, PieceApiList, PieceAutocomplete, PracticeApiDetail, PracticeApiList
+from .views import CustomLoginView, GoalCreate, GoalDelete, GoalUpdate, InstrumentCreate, InstrumentDelete, InstrumentDetail, InstrumentList, InstrumentMerge, InstrumentUpdate, JobDetail, JobDownload, PieceCreate, PieceDelete, PieceDetail, PieceList, PieceMerge, PieceUpdate, PracticeBulk, PracticeDelete, PracticeDetail, PracticeList, PracticeCreate, PracticeExport, PracticeImport, PracticeUpdate, RegisterView, InfoView, MetricsView, SearchView, StatsCacheView
+
+if settings.ASYNC_VIEWS:
+    # Under ASGI the list and detail pages fetch their rows and stats concurrently
+    from .async_views import AsyncInstrumentDetail as InstrumentDetail, AsyncInstrumentList as InstrumentList, AsyncPieceDetail as PieceDetail, AsyncPieceList as PieceList, AsyncPracticeDetail as PracticeDetail, AsyncPracticeList as PracticeList
 
 urlpatterns = [
     path('', InfoView.as_view(), name='info'),
@@ -13,14 +19,37 @@ urlpatterns = [
     path('practice-create/', PracticeCreate.as_view(), name='practice create'),
     path('practice-update/<int:pk>/', PracticeUpdate.as_view(), name='practice update'),
     path('practice-delete/<int:pk>/', PracticeDelete.as_view(), name='practice delete'),
+    path('practice-import/', PracticeImport.as_view(), name='practice import'),
+    path('practice-bulk/', PracticeBulk.as_view(), name='practice bulk'),
+    path('practice-export/', PracticeExport.as_view(), name='practice export'),
     path('instruments', InstrumentList.as_view(), name='instrument list'),
     path('instrument/<int:pk>/', InstrumentDetail.as_view(), name='instrument detail'),
     path('instrument-create/', InstrumentCreate.as_view(), name='instrument create'),
     path('instrument-update/<int:pk>/', InstrumentUpdate.as_view(), name='instrument update'),
     path('instrument-delete/<int:pk>/', InstrumentDelete.as_view(), name='instrument delete'),
+    path('instrument-merge/', InstrumentMerge.as_view(), name='instrument merge'),
     path('pieces', PieceList.as_view(), name='piece list'),
     path('piece/<int:pk>/', PieceDetail.as_view(), name='piece detail'),
     path('piece-create/', PieceCreate.as_view(), name='piece create'),
     path('piece-update/<int:pk>/', PieceUpdate.as_view(), name='piece update'),
     path('piece-delete/<int:pk>/', PieceDelete.as_view(), name='piece delete'),
+    path('piece-merge/', PieceMerge.as_view(), name='piece merge'),
+    path('goal-create/', GoalCreate.as_view(), name='goal create'),
+    path('goal-update/<int:pk>/', GoalUpdate.as_view(), name='goal update'),
+    path('goal-delete/<int:pk>/', GoalDelete.as_view(), name='goal delete'),
+    path('job/<int:pk>/', JobDetail.as_view(), name='job detail'),
+    path('job-download/<int:pk>/', JobDownload.as_view(), name='job download'),
+    path('search/', SearchView.as_view(), name='search'),
+    path('stats-cache/', StatsCacheView.as_view(), name='stats cache'),
+    path('metrics', MetricsView.as_view(), name='metrics'),
+    path('api/sessions/', PracticeApiList.as_view(), name='api practice list'),
+    path('api/sessions/<int:pk>/', PracticeApiDetail.as_view(), name='api practice detail'),
+    path('api/instruments/', InstrumentApiList.as_view(), name='api instrument list'),
+    path('api/instruments/<int:pk>/', InstrumentApiDetail.as_view(), name='api instrument detail'),
+    path('api/instruments/autocomplete/', InstrumentAutocomplete.as_view(), name='api instrument autocomplete'),
+    path('api/pieces/', PieceApiList.as_view(), name='api piece list'),
+    path('api/pieces/<int:pk>/', PieceApiDetail.as_view(), name='api piece detail'),
+    path('api/pieces/autocomplete/', PieceAutocomplete.as_view(), name='api piece autocomplete'),
+    path('api/jobs/<int:pk>/', JobApiDetail.as_view(), name='api job detail'),
+    path('api/analytics/', AnalyticsApi.as_view(), name='api analytics'),
 ]
\ No newline at end of file
@@ -0,0 +1,21 @@
+import datetime
+
+from django.core.exceptions import ValidationError
+
+
+def validate_duration(value):
+    if value < datetime.timedelta(days=0, seconds=0):
+        raise ValidationError(
+            "duration is too low"
+        )
+    if value > datetime.timedelta(days = 0, hours=23, minutes=59, seconds=59):
+        raise ValidationError(
+            "duration is too high"
+        )
+
+
+def validate_goal_target(value):
+    if value <= datetime.timedelta(0):
+        raise ValidationError(
+            "target is too low"
+        )
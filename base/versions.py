@@ -0,0 +1,64 @@
+import datetime
+import hashlib
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from .models import DataVersion
+
+
+def bump(user_id):
+    # Runs after the write. Inside a transaction (bulk actions, imports) the new version commits with the data,
+    # but an autocommit save is already visible, so until this UPDATE lands a reader can still get a 304 or a
+    # cached stats part for the old version. Anything cached in that window is under the old version and
+    # is never read again once it changes.
+    # A user without a row has never been served a validator, so there is nothing to invalidate.
+    if user_id is None:
+        return
+    DataVersion.objects.filter(user_id=user_id).update(version=F('version') + 1, updated_at=timezone.now())
+
+
+def current(user_id):
+    row = DataVersion.objects.filter(user_id=user_id).values_list('version', 'updated_at').first()
+    if row is None:
+        try:
+            with transaction.atomic():
+                version = DataVersion.objects.create(user_id=user_id)
+        except IntegrityError:
+            # Another request created it first
+            version = DataVersion.objects.get(user_id=user_id)
+        row = version.version, version.updated_at
+    return row
+
+
+def validators(user_id, today=None, token='', since=None):
+    """The ETag and Last-Modified time of a page built from the user's data.
+
+    Pages also change with the day (streaks, the heatmap), so the day is part of the ETag and
+    Last-Modified is never earlier than midnight. Pages with forms embed the CSRF token, which changes
+    on login, so a hash of `token` goes into the ETag and the login time (`since`) bounds Last-Modified.
+    """
+    today = today or datetime.date.today()
+    version, updated_at = current(user_id)
+    midnight = timezone.make_aware(datetime.datetime.combine(today, datetime.time()))
+    token_hash = hashlib.sha256(token.encode()).hexdigest()[:12] if token else ''
+    etag = quote_etag(f"{user_id}.{version}.{today.isoformat()}.{token_hash}")
+    # HTTP dates have whole seconds
+    return etag, int(max(updated_at, midnight, since or midnight).timestamp())
+
+
+def conditional_response(request, etag, last_modified):
+    # A 304 (or a 412 for a failed If-Match) when the client's copy is current, otherwise None
+    return get_conditional_response(request, etag=etag, last_modified=last_modified)
+
+
+def add_validators(response, etag, last_modified):
+    if 200 <= response.status_code < 300:
+        response.setdefault('ETag', etag)
+        response.setdefault('Last-Modified', http_date(last_modified))
+    # The page is per user, and the browser should revalidate it rather than reuse it blindly
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
@@ -1,23 +1,36 @@
+import csv
 import datetime
+import io
 
-from django.core.exceptions import ValidationError
-
-from base.models import Piece, Practice, Instrument
-from django.shortcuts import render, redirect
+from base.models import Goal, Job, Piece, Practice, Instrument, InstrumentTotal, PieceTotal, UserTotal
+from django.shortcuts import get_object_or_404, render, redirect
 from django.views.generic.list import ListView
 from django.views.generic.detail import DetailView
 from django.views.generic.edit import CreateView, UpdateView, DeleteView, FormView
-from django.views.generic.base import TemplateView
-from django.urls import reverse_lazy
+from django.views.generic.base import TemplateView, View
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
+from django.utils.crypto import constant_time_compare
+from django.urls import reverse, reverse_lazy
 from django import forms
 from django.forms.widgets import DateTimeInput, Select, SplitDateTimeWidget, SelectDateWidget, TextInput, Textarea
 from durationwidget.widgets import TimeDurationWidget
 from django.contrib.auth.views import LoginView
-from django.contrib.auth.mixins import LoginRequiredMixin
+from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth import login
 from .filters import InstrumentFilter, PieceFilter, PracticeFilter
-from django.db.models import Max, Avg, Sum, Count
+from .validators import validate_duration, validate_goal_target
+from .widgets import AutocompleteSelect
+from .forms import BulkActionForm, ImportForm, MergeForm
+from .importers import guess_format, import_sessions, read_rows
+from .stats import leaderboard, most_practiced, with_practice_stats
+from .rollups import totals_for
+from .pagination import KeysetPaginator
+from . import bulk, exports, jobs, merge, metrics, search, stats_cache, streaks, versions
+from .heatmap import heatmap
+from .goals import goals_by_subject, goals_for
+from django.db.models import Max, Avg, Sum
 
 # Create your views here.
 class InfoView(TemplateView):
@@ -25,6 +38,42 @@ class InfoView(TemplateView):
     
 
 
+class StatsCacheView(UserPassesTestMixin, View):
+    # Hit/miss counters of this process's stats cache, for monitoring
+    def test_func(self):
+        return self.request.user.is_staff
+
+    def get(self, request, *args, **kwargs):
+        return JsonResponse(stats_cache.cache_info())
+
+
+class SearchView(LoginRequiredMixin, TemplateView):
+    # Instruments, pieces and sessions matching ?q=, ranked together
+    template_name = 'base/search.html'
+    login_url = reverse_lazy('info')
+    result_limit = 50
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['query'] = self.request.GET.get('q', '')
+        context['results'] = search.search(self.request.user, context['query'], limit=self.result_limit)
+        return context
+
+
+class MetricsView(View):
+    # Prometheus scrape endpoint for the performance middleware's numbers
+    def get(self, request, *args, **kwargs):
+        if not settings.PERFORMANCE_METRICS:
+            raise Http404
+        if settings.METRICS_TOKEN:
+            allowed = constant_time_compare(request.headers.get('Authorization', ''), f"Bearer {settings.METRICS_TOKEN}")
+        else:
+            allowed = request.user.is_staff
+        if not allowed:
+            return HttpResponseForbidden()
+        return HttpResponse(metrics.render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
 class CustomLoginView(LoginView):
     template_name = 'base/login.html'
     fields = '__all__'
@@ -54,58 +103,192 @@ class RegisterView(FormView):
 
 
 
-class PracticeList(LoginRequiredMixin, ListView):
+class ContextPartsMixin:
+    # A page's context is built from independent parts (its rows, its stats, ...), so the async views can fetch them concurrently
+    context_parts = None
+
+    def get_context_parts(self):
+        return []
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        parts = self.context_parts if self.context_parts is not None else [part() for part in self.get_context_parts()]
+        for part in parts:
+            context.update(part)
+        return context
+
+
+class ConditionalGetMixin:
+    # Answers GETs with 304 Not Modified while the user's data version (and the day) are unchanged;
+    # goes after LoginRequiredMixin, so only signed-in users get here
+    def get_validators(self):
+        user = self.request.user
+        return versions.validators(user.pk, token=self.request.META.get('CSRF_COOKIE', ''), since=user.last_login)
+
+    def get_conditional_response(self, request):
+        if request.method not in ('GET', 'HEAD'):
+            return None, None
+        validators = self.get_validators()
+        return versions.conditional_response(request, *validators), validators
+
+    def dispatch(self, request, *args, **kwargs):
+        response, validators = self.get_conditional_response(request)
+        if response is not None:
+            return response
+        response = super().dispatch(request, *args, **kwargs)
+        return versions.add_validators(response, *validators) if validators else response
+
+
+class FilteredListMixin(ContextPartsMixin, LoginRequiredMixin):
+    # The user's rows are scoped and filtered once; the page, the rows and the stats all come from that one queryset
+    filterset_class = None
+    login_url = reverse_lazy('info')
+
+    def get_base_queryset(self):
+        return super().get_queryset().filter(user=self.request.user)
+
+    def get_queryset(self):
+        self.filterset = self.filterset_class(self.request.GET, queryset=self.get_base_queryset(), request=self.request)
+        return self.filterset.qs
+
+    def filter_is_active(self):
+        form = self.filterset.form
+        return form.is_valid() and any(value not in (None, '') for value in form.cleaned_data.values())
+
+    def filter_cache_key(self):
+        # Identifies the active filter (but not the page) for the stats cache
+        if not self.filter_is_active():
+            return ''
+        return '&'.join(f"{key}={value}" for key, value in sorted(self.request.GET.items()) if key not in ('page', 'after', 'before'))
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['filter'] = self.filterset
+        # Versions the cached stats panel fragment the same way as the stats it shows
+        context['stats_key'] = stats_cache.stats_key(self.request.user.pk, 'panel', datetime.date.today(), self.filter_cache_key())
+        return context
+
+
+class PracticeList(FilteredListMixin, ConditionalGetMixin, ListView):
     model = Practice
     context_object_name = 'sessions'
     ordering = ['-date']
-    login_url = reverse_lazy('info')
+    filterset_class = PracticeFilter
+    streak_history_size = 10
+    page_size = 50
 
     def current_streak(self):
-        total_streak = 0
-        current_streak = 0
-        today = datetime.date.today()
-        compareDate = today + datetime.timedelta(1) # Tomorrow
+        return streaks.current_streak(self.request.user)
 
-        # Using list() here pulls all the entries from the DB at once
-        # Gets all entry dates for this journal and whose dates are <= today
-        entry_dates = list(Practice.objects.values("date").filter(user=self.request.user, date__lte = today).order_by("-date"))
+    def get_session_stats(self, totals):
+        if self.filter_is_active():
+            return self.object_list.aggregate(longest_session=Max('duration'), avg_session=Avg('duration'), sum_session=Sum('duration'))
+        # Unfiltered stats are exactly what the rollup already holds
+        return {'longest_session': totals.longest_session, 'avg_session': totals.avg_duration, 'sum_session': totals.total_duration}
 
-        for date in entry_dates:
-            # Get the difference btw the dates
-            delta = compareDate - date.get("date")
+    def get_stats(self):
+        totals = totals_for(UserTotal, user=self.request.user)
+        stats = self.get_session_stats(totals)
+        stats['streak'] = self.current_streak()
+        stats['longest_streak'] = totals.longest_streak
+        stats['streak_history'] = list(streaks.history(self.request.user, limit=self.streak_history_size))
+        return stats
 
-            if delta.days == 1: # Keep the streak going!
-                current_streak += 1
-            elif delta.days == 0: # Don't bother increasing the day if there's multiple ones on the same day
-                pass
-            else: # Awwww...
-                break # The current streak is done, exit the loop
+    def get_page(self):
+        page = KeysetPaginator(self.object_list, self.page_size).page(after=self.request.GET.get('after'), before=self.request.GET.get('before'))
+        return {'page_obj': page, 'sessions': page.object_list}
 
-            compareDate = date.get("date")
+    def get_cached_stats(self):
+        # The current streak depends on the day, so today is part of the key
+        return stats_cache.get_or_compute(self.request.user.pk, 'practice', self.get_stats, datetime.date.today(), self.filter_cache_key())
 
-        if current_streak > total_streak:
-            total_streak = current_streak
+    def get_heatmap(self):
+        return {'heatmap': stats_cache.get_or_compute(self.request.user.pk, 'heatmap', lambda: heatmap(self.request.user), datetime.date.today())}
 
-        return total_streak
-  
+    def get_context_parts(self):
+        return [self.get_page, self.get_cached_stats, self.get_heatmap]
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['sessions'] = context['sessions'].filter(user=self.request.user)
-        context['filter'] = PracticeFilter(self.request.GET, queryset=self.get_queryset().filter(user=self.request.user), request=self.request)
-        context['streak'] = self.current_streak()
-        context['longest_session'] = context['sessions'].aggregate(Max('duration')).get('duration__max')
-        context['avg_session'] = context['sessions'].aggregate(Avg('duration')).get('duration__avg')
-        context['sum_session'] = context['sessions'].aggregate(Sum('duration')).get('duration__sum')
+        context['export_formats'] = exports.available_formats()
+        context['background_exports'] = settings.BACKGROUND_JOBS
+        context['bulk_form'] = BulkActionForm(user=self.request.user)
         return context
 
 
 
-class PracticeDetail(LoginRequiredMixin, DetailView):
+class PracticeExport(FilteredListMixin, ListView):
+    # Streams the filtered session history as a download; takes the same query parameters as PracticeList
+    model = Practice
+    filterset_class = PracticeFilter
+
+    def get(self, request, *args, **kwargs):
+        format = request.GET.get('format', 'csv')
+        if format not in exports.available_formats():
+            return HttpResponseBadRequest(f"Unsupported export format '{format}'")
+        content_type, extension = exports.FORMATS[format]
+        response = StreamingHttpResponse(exports.stream_export(self.get_queryset(), format), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="studiolog-sessions.{extension}"'
+        return response
+
+    def post(self, request, *args, **kwargs):
+        # With BACKGROUND_JOBS the export is built by a worker and downloaded from the job's page
+        format = request.POST.get('format', 'csv')
+        if not settings.BACKGROUND_JOBS or format not in exports.available_formats():
+            return HttpResponseBadRequest(f"Unsupported export format '{format}'")
+        filters = request.GET.copy()
+        for key in ('after', 'before', 'page'):
+            filters.pop(key, None)
+        job = jobs.enqueue(request.user, 'export_sessions', format=format, filters=filters.urlencode())
+        return redirect('job detail', job.pk)
+
+
+
+class PracticeBulk(FilteredListMixin, ListView):
+    # Bulk actions from the practice list; takes the list's query parameters to select "all matching sessions"
+    model = Practice
+    filterset_class = PracticeFilter
+    template_name = 'base/practice_bulk_confirm.html'
+
+    def get(self, request, *args, **kwargs):
+        return redirect('practice list')
+
+    def list_url(self):
+        filters = self.request.GET.copy()
+        for key in ('after', 'before', 'page'):
+            filters.pop(key, None)
+        return f"{reverse('practice list')}?{filters.urlencode()}" if filters else reverse('practice list')
+
+    def post(self, request, *args, **kwargs):
+        form = BulkActionForm(request.POST, user=request.user)
+        if not form.is_valid():
+            return render(request, self.template_name, {'form': form, 'back_url': self.list_url()})
+        data = form.cleaned_data
+        sessions = self.get_queryset() if data['matching'] else data['sessions']
+        if not data['confirm']:
+            # Nothing changes until the user has seen how many sessions the action covers
+            confirm = BulkActionForm(initial={**data, 'sessions': [session.pk for session in data['sessions']], 'confirm': True}, user=request.user)
+            return render(request, self.template_name, {'form': confirm, 'data': data, 'count': sessions.count(), 'back_url': self.list_url()})
+
+        if data['action'] == 'reassign':
+            changes = {field: data[field] for field in ('instrument', 'piece') if data[field] is not None}
+            bulk.reassign(request.user, sessions, **changes)
+        elif data['action'] == 'shift':
+            bulk.shift_dates(request.user, sessions, data['days'])
+        else:
+            bulk.delete(request.user, sessions)
+        return redirect(self.list_url())
+
+
+class PracticeDetail(LoginRequiredMixin, ConditionalGetMixin, DetailView):
     model = Practice
     context_object_name = 'session'
     login_url = reverse_lazy('info')
 
+    def get_queryset(self):
+        # The page is validated against its viewer's data version, so it can only show their own session
+        return super().get_queryset().filter(user=self.request.user).select_related('instrument', 'piece')
+
 class PracticeCreate(LoginRequiredMixin, CreateView):
     model = Practice
     fields = ['date', 'duration', 'instrument', 'piece', 'notes']
@@ -114,28 +297,17 @@ class PracticeCreate(LoginRequiredMixin, CreateView):
     this_year = datetime.datetime.now().year
     login_url = reverse_lazy('info')
 
-    def validate_duration(self, value):
-        if value < datetime.timedelta(days=0, seconds=0):
-            raise ValidationError(
-                "duration is too low"
-            )
-        if value > datetime.timedelta(days = 0, hours=23, minutes=59, seconds=59):
-            raise ValidationError(
-                "duration is too high"
-            )
-        
-
     def get_form(self):
         form = super(PracticeCreate, self).get_form()
         form.fields['date'].widget = SelectDateWidget(years=range(self.this_year - self.date_range, self.this_year + self.date_range + 1), attrs={'class': 'create-field session-date'})
         form.fields['duration'].widget = TimeDurationWidget(show_days=False, show_hours=True, show_minutes=True, show_seconds=False, attrs={'class': 'create-field session-duration'})
-        form.fields['instrument'].widget = Select(attrs={'class': 'create-field session-instrument'})
-        form.fields['piece'].widget = Select(attrs={'class': 'create-field session-piece'})
+        form.fields['instrument'].widget = AutocompleteSelect(reverse_lazy('api instrument autocomplete'), attrs={'class': 'create-field session-instrument'})
+        form.fields['piece'].widget = AutocompleteSelect(reverse_lazy('api piece autocomplete'), attrs={'class': 'create-field session-piece'})
         form.fields['notes'].widget = Textarea(attrs={'class': 'create-field session-notes'})
         form.fields['piece'].queryset = Piece.objects.filter(user=self.request.user)
         form.fields['instrument'].queryset = Instrument.objects.filter(user=self.request.user)
         form.fields['date'].initial = datetime.datetime.now()
-        form.fields['duration'].validators=[self.validate_duration]
+        form.fields['duration'].validators=[validate_duration]
         return form
 
     def form_valid(self, form):
@@ -150,76 +322,128 @@ class PracticeUpdate(LoginRequiredMixin, UpdateView):
     this_year = datetime.datetime.now().year
     login_url = reverse_lazy('info')
 
-    def validate_duration(self, value):
-        if value < datetime.timedelta(days=0, seconds=0):
-            raise ValidationError(
-                "duration is too low"
-            )
-        if value > datetime.timedelta(days = 0, hours=23, minutes=59, seconds=59):
-            raise ValidationError(
-                "duration is too high"
-            )
-
     def get_form(self):
         form = super(PracticeUpdate, self).get_form()
         form.fields['date'].widget = SelectDateWidget(years=range(self.this_year - self.date_range, self.this_year + self.date_range + 1), attrs={'class': 'create-field session-date'})
         form.fields['duration'].widget = TimeDurationWidget(show_days=False, show_hours=True, show_minutes=True, show_seconds=False, attrs={'class': 'create-field session-duration'})
-        form.fields['instrument'].widget = Select(attrs={'class': 'create-field session-instrument'})
-        form.fields['piece'].widget = Select(attrs={'class': 'create-field session-piece'})
+        form.fields['instrument'].widget = AutocompleteSelect(reverse_lazy('api instrument autocomplete'), attrs={'class': 'create-field session-instrument'})
+        form.fields['piece'].widget = AutocompleteSelect(reverse_lazy('api piece autocomplete'), attrs={'class': 'create-field session-piece'})
         form.fields['notes'].widget = Textarea(attrs={'class': 'create-field session-notes'})
         form.fields['piece'].queryset = Piece.objects.filter(user=self.request.user)
         form.fields['instrument'].queryset = Instrument.objects.filter(user=self.request.user)
-        form.fields['duration'].validators=[self.validate_duration]
+        form.fields['duration'].validators=[validate_duration]
         
         return form
 
+class PracticeImport(LoginRequiredMixin, FormView):
+    template_name = 'base/practice_import.html'
+    form_class = ImportForm
+    login_url = reverse_lazy('info')
+
+    def form_valid(self, form):
+        upload = form.cleaned_data['file']
+        format = form.cleaned_data['format'] or guess_format(upload.name)
+        if settings.BACKGROUND_JOBS:
+            job = jobs.enqueue(self.request.user, 'import_sessions', payload=upload.read(), format=format)
+            return redirect('job detail', job.pk)
+        stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+        try:
+            result = import_sessions(self.request.user, read_rows(stream, format))
+        except (ValueError, csv.Error) as error:
+            form.add_error('file', f"Could not read the file: {error}")
+            return self.form_invalid(form)
+        return self.render_to_response(self.get_context_data(form=self.form_class(), result=result))
+
 class PracticeDelete(LoginRequiredMixin, DeleteView):
     model = Practice
     context_object_name = 'session'
     success_url = reverse_lazy('practice list')
     login_url = reverse_lazy('info')
 
-class InstrumentList(LoginRequiredMixin, ListView):
+class InstrumentList(FilteredListMixin, ConditionalGetMixin, ListView):
     model = Instrument
     context_object_name = 'instruments'
-    login_url = reverse_lazy('info')
+    filterset_class = InstrumentFilter
+    leaderboard_size = 5
+    page_size = 50
 
-    def get_most_practiced(self, instruments):
-        most_practiced_name = ""
-        most_practiced_hours = datetime.timedelta(days=0, seconds=0)
-        for instrument in instruments:
-            current_sum = instrument.sessions.all().aggregate(Sum('duration')).get('duration__sum')
-            if current_sum is None:
-                continue
-            print(current_sum)
-            if current_sum > most_practiced_hours:
-                most_practiced_hours = current_sum
-                most_practiced_name = instrument.name
+    def get_most_practiced(self, ranked):
+        return most_practiced(ranked)
 
-        return most_practiced_name, most_practiced_hours
+    def get_queryset(self):
+        return with_practice_stats(super().get_queryset()).order_by('name', 'id')
 
+    def get_page(self):
+        paginator, page, object_list, is_paginated = self.paginate_queryset(self.object_list, self.page_size)
+        # Fetched here, alongside the other parts, rather than while the template renders
+        page.object_list = list(object_list)
+        return {'paginator': paginator, 'page_obj': page, 'is_paginated': is_paginated, 'object_list': page.object_list, 'instruments': page.object_list}
 
-    
+    def get_leaderboard(self):
+        return {'leaderboard': stats_cache.get_or_compute(self.request.user.pk, 'instrument leaderboard', lambda: list(leaderboard(self.filterset.qs, limit=self.leaderboard_size)), self.filter_cache_key())}
+
+    def get_goals(self):
+        return {'goals': goals_by_subject(self.request.user, 'instrument')}
+
+    def get_context_parts(self):
+        return [self.get_page, self.get_leaderboard, self.get_goals]
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['instruments'] = context['instruments'].filter(user=self.request.user)
-        context['filter'] = InstrumentFilter(self.request.GET, queryset=self.get_queryset().filter(user=self.request.user), request=self.request)
-        context['most_practiced_name'], context['most_practiced_hours'] = self.get_most_practiced(context['instruments'])
-        context['total_instruments'] = context['instruments'].aggregate(Count('name')).get('name__count')
+        context['most_practiced_name'], context['most_practiced_hours'] = self.get_most_practiced(context['leaderboard'])
+        context['total_instruments'] = context['paginator'].count
+        for instrument in context['instruments']:
+            instrument.goals_progress = context['goals'].get(instrument.pk, [])
         return context
 
-class InstrumentDetail(LoginRequiredMixin, DetailView):
-    model = Instrument
-    context_object_name = 'instrument'
+class MergeView(LoginRequiredMixin, TemplateView):
+    # Lists the user's duplicate instruments (or pieces) and merges one group per POST
+    model = None
+    template_name = 'base/merge.html'
     login_url = reverse_lazy('info')
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['avg_session'] = context['instrument'].sessions.all().aggregate(Avg('duration')).get('duration__avg')
-        context['sum_session'] = context['instrument'].sessions.all().aggregate(Sum('duration')).get('duration__sum')
+        context['groups'] = merge.duplicate_groups(self.model, self.request.user)
+        context['kind'] = self.model._meta.verbose_name_plural
+        context['show_artist'] = self.model is Piece
+        context['list_url'] = reverse(f'{self.model._meta.model_name} list')
         return context
 
+    def post(self, request, *args, **kwargs):
+        form = MergeForm(request.POST, model=self.model, user=request.user)
+        if not form.is_valid():
+            return HttpResponseBadRequest('Choose the entry to keep and the duplicates to merge into it')
+        merge.merge(request.user, form.cleaned_data['winner'], form.cleaned_data['merge'])
+        return redirect(f'{self.model._meta.model_name} merge')
+
+class InstrumentMerge(MergeView):
+    model = Instrument
+
+class InstrumentDetail(ContextPartsMixin, LoginRequiredMixin, ConditionalGetMixin, DetailView):
+    model = Instrument
+    context_object_name = 'instrument'
+    login_url = reverse_lazy('info')
+
+    def get_queryset(self):
+        return super().get_queryset().filter(user=self.request.user)
+
+    def get_stats(self):
+        totals = totals_for(InstrumentTotal, instrument=self.object)
+        return {'avg_session': totals.avg_duration, 'sum_session': totals.total_duration}
+
+    def get_sessions(self):
+        return {'sessions': list(self.object.sessions.select_related('piece'))}
+
+    def get_cached_stats(self):
+        return stats_cache.get_or_compute(self.object.user_id, 'instrument', self.get_stats, self.object.pk)
+
+    def get_goals(self):
+        return {'goals': goals_for(self.request.user, instrument=self.object)}
+
+    def get_context_parts(self):
+        return [self.get_sessions, self.get_cached_stats, self.get_goals]
+
 class InstrumentCreate(LoginRequiredMixin, CreateView):
     model = Instrument
     fields = ['name', 'notes']
@@ -250,50 +474,84 @@ class InstrumentUpdate(LoginRequiredMixin, UpdateView):
         return form
 
 
-class InstrumentDelete(LoginRequiredMixin, DeleteView):
+class InstrumentDelete(ContextPartsMixin, LoginRequiredMixin, DeleteView):
     model = Instrument
     context_object_name = 'instrument'
     success_url = reverse_lazy('instrument list')
     login_url = reverse_lazy('info')
 
-class PieceList(LoginRequiredMixin, ListView):
+    def get_queryset(self):
+        return super().get_queryset().filter(user=self.request.user)
+
+    def get_sessions(self):
+        # The confirmation lists the sessions that will lose their instrument, with their piece in the same query
+        return {'sessions': list(self.object.sessions.select_related('piece'))}
+
+    def get_context_parts(self):
+        return [self.get_sessions]
+
+class PieceList(FilteredListMixin, ConditionalGetMixin, ListView):
     model = Piece
     context_object_name = 'pieces'
-    login_url = reverse_lazy('info')
+    filterset_class = PieceFilter
+    leaderboard_size = 5
+    page_size = 50
+
+    def get_most_practiced(self, ranked):
+        return most_practiced(ranked)
 
-    def get_most_practiced(self, pieces):
-        most_practiced_name = ""
-        most_practiced_hours = datetime.timedelta(days=0, seconds=0)
-        for piece in pieces:
-            current_sum = piece.sessions.all().aggregate(Sum('duration')).get('duration__sum')
-            if current_sum is None:
-                continue
-            print(current_sum)
-            if current_sum > most_practiced_hours:
-                most_practiced_hours = current_sum
-                most_practiced_name = piece.name
+    def get_queryset(self):
+        return with_practice_stats(super().get_queryset()).order_by('name', 'id')
 
-        return most_practiced_name, most_practiced_hours
+    def get_page(self):
+        paginator, page, object_list, is_paginated = self.paginate_queryset(self.object_list, self.page_size)
+        # Fetched here, alongside the other parts, rather than while the template renders
+        page.object_list = list(object_list)
+        return {'paginator': paginator, 'page_obj': page, 'is_paginated': is_paginated, 'object_list': page.object_list, 'pieces': page.object_list}
 
+    def get_leaderboard(self):
+        return {'leaderboard': stats_cache.get_or_compute(self.request.user.pk, 'piece leaderboard', lambda: list(leaderboard(self.filterset.qs, limit=self.leaderboard_size)), self.filter_cache_key())}
+
+    def get_goals(self):
+        return {'goals': goals_by_subject(self.request.user, 'piece')}
+
+    def get_context_parts(self):
+        return [self.get_page, self.get_leaderboard, self.get_goals]
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['pieces'] = context['pieces'].filter(user=self.request.user)
-        context['filter'] = PieceFilter(self.request.GET, queryset=self.get_queryset().filter(user=self.request.user), request=self.request)
-        context['most_practiced_name'], context['most_practiced_hours'] = self.get_most_practiced(context['pieces'])
-        context['total_pieces'] = context['pieces'].aggregate(Count('name')).get('name__count')
+        context['most_practiced_name'], context['most_practiced_hours'] = self.get_most_practiced(context['leaderboard'])
+        context['total_pieces'] = context['paginator'].count
+        for piece in context['pieces']:
+            piece.goals_progress = context['goals'].get(piece.pk, [])
         return context
 
-class PieceDetail(LoginRequiredMixin, DetailView):
+class PieceMerge(MergeView):
+    model = Piece
+
+class PieceDetail(ContextPartsMixin, LoginRequiredMixin, ConditionalGetMixin, DetailView):
     model = Piece
     context_object_name = 'piece'
     login_url = reverse_lazy('info')
-    
-    def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        context['avg_session'] = context['piece'].sessions.all().aggregate(Avg('duration')).get('duration__avg')
-        context['sum_session'] = context['piece'].sessions.all().aggregate(Sum('duration')).get('duration__sum')
-        return context
+
+    def get_queryset(self):
+        return super().get_queryset().filter(user=self.request.user)
+
+    def get_stats(self):
+        totals = totals_for(PieceTotal, piece=self.object)
+        return {'avg_session': totals.avg_duration, 'sum_session': totals.total_duration}
+
+    def get_sessions(self):
+        return {'sessions': list(self.object.sessions.select_related('instrument'))}
+
+    def get_cached_stats(self):
+        return stats_cache.get_or_compute(self.object.user_id, 'piece', self.get_stats, self.object.pk)
+
+    def get_goals(self):
+        return {'goals': goals_for(self.request.user, piece=self.object)}
+
+    def get_context_parts(self):
+        return [self.get_sessions, self.get_cached_stats, self.get_goals]
 
     
 
@@ -330,15 +588,92 @@ class PieceUpdate(LoginRequiredMixin, UpdateView):
         return form
 
 
-class PieceDelete(LoginRequiredMixin, DeleteView):
+class PieceDelete(ContextPartsMixin, LoginRequiredMixin, DeleteView):
     model = Piece
     context_object_name = 'piece'
     success_url = reverse_lazy('piece list')
     login_url = reverse_lazy('info')
 
+    def get_queryset(self):
+        return super().get_queryset().filter(user=self.request.user)
 
+    def get_sessions(self):
+        # The confirmation lists the sessions that will lose their piece, with their instrument in the same query
+        return {'sessions': list(self.object.sessions.select_related('instrument'))}
 
+    def get_context_parts(self):
+        return [self.get_sessions]
 
 
+class GoalMixin(LoginRequiredMixin):
+    model = Goal
+    fields = ['period', 'target']
+    login_url = reverse_lazy('info')
+
+    def get_queryset(self):
+        return Goal.objects.filter(user=self.request.user).select_related('instrument', 'piece')
+
+    def get_subject(self):
+        return self.object.subject
+
+    def get_success_url(self):
+        subject = self.get_subject()
+        return reverse(f"{subject._meta.model_name} detail", args=[subject.pk])
+
+    def get_form(self):
+        form = super().get_form()
+        form.fields['period'].widget = Select(attrs={'class': 'create-field goal-period'})
+        form.fields['target'].widget = TimeDurationWidget(show_days=False, show_hours=True, show_minutes=True, show_seconds=False, attrs={'class': 'create-field goal-target'})
+        form.fields['target'].validators = [validate_goal_target]
+        return form
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['subject'] = self.get_subject()
+        context['back_url'] = self.get_success_url()
+        return context
+
+
+class GoalCreate(GoalMixin, CreateView):
+    # The instrument or piece comes from the query string: goal-create/?instrument=<pk> or ?piece=<pk>
 
+    def get_subject(self):
+        if not hasattr(self, 'subject'):
+            for field, model in (('instrument', Instrument), ('piece', Piece)):
+                if field in self.request.GET:
+                    self.subject = get_object_or_404(model, pk=self.request.GET[field], user=self.request.user)
+                    break
+            else:
+                raise Http404('A goal needs an instrument or a piece')
+        return self.subject
+
+    def form_valid(self, form):
+        form.instance.user = self.request.user
+        setattr(form.instance, self.get_subject()._meta.model_name, self.get_subject())
+        return super().form_valid(form)
+
+
+class GoalUpdate(GoalMixin, UpdateView):
+    pass
+
+
+class GoalDelete(GoalMixin, DeleteView):
+    context_object_name = 'goal'
+
+
+class JobDetail(LoginRequiredMixin, DetailView):
+    # Polls the job's status endpoint until it finishes
+    model = Job
+    context_object_name = 'job'
+    login_url = reverse_lazy('info')
+
+    def get_queryset(self):
+        return Job.objects.filter(user=self.request.user).defer('payload')
+
+
+class JobDownload(LoginRequiredMixin, View):
+    login_url = reverse_lazy('info')
 
+    def get(self, request, pk):
+        job = get_object_or_404(Job.objects.defer('payload'), pk=pk, user=request.user, status='done', output__gt='')
+        return FileResponse(job.output.open('rb'), as_attachment=True, filename=job.result['filename'], content_type=job.result['content_type'])
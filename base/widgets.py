@@ -0,0 +1,30 @@
+from django.forms.widgets import Select
+
+
+class AutocompleteSelect(Select):
+    """A Select for a ModelChoiceField that renders only its current value instead of every choice.
+
+    autocomplete.js adds a search box in front of it and fills in the options matching what is typed from
+    `url`, so pages with these pickers stay small however many instruments or pieces the user has.
+    """
+
+    def __init__(self, url, attrs=None):
+        super().__init__(attrs)
+        self.url = url
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        context['widget']['attrs']['data-autocomplete-url'] = str(self.url)
+        return context
+
+    def optgroups(self, name, value, attrs=None):
+        # Only the selected object is loaded, by primary key, rather than the field's whole queryset
+        selected = [pk for pk in value if str(pk).isdigit()]
+        choices = [('', '---------')]
+        if selected:
+            choices += [(obj.pk, str(obj)) for obj in self.choices.queryset.filter(pk__in=selected)]
+        all_choices, self.choices = self.choices, choices
+        try:
+            return super().optgroups(name, value, attrs)
+        finally:
+            self.choices = all_choices
@@ -0,0 +1,8 @@
+# ASGI deployment: gunicorn -c gunicorn_asgi.py StudioLog.asgi:application
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+worker_class = 'uvicorn.workers.UvicornWorker'
+# The async list/detail views are only worth routing to under an event loop
+raw_env = ['ASYNC_VIEWS=True']